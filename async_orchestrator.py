@@ -0,0 +1,340 @@
+"""
+asyncio 运行模式
+定位、天气、豆包、TTS 等网络请求都作为协程跑在同一个事件循环线程上，共用一个 aiohttp 会话；
+检测线程通过线程安全的接口提交任务和取消任务，音频数据经单线程执行器交给播放器。
+每次夸奖是一个任务，内部的子任务（生成文本、合成语音）在 TaskGroup 中运行，
+人离开画面或超过时限时整个任务连同子任务一起取消
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from llm_stream import SentenceSplitter, parse_sse_line
+
+logger = logging.getLogger(__name__)
+
+
+async def _iter_lines(response):
+    """逐行读取响应体；TTS 的一行可能很长，不用 aiohttp 自带的按行读取（有长度上限）"""
+    buffer = b''
+    async for data in response.content.iter_any():
+        buffer += data
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line.decode('utf-8').strip()
+    if buffer:
+        yield buffer.decode('utf-8').strip()
+
+
+async def _drain(lines):
+    """读完剩余的响应体；没读完就释放的响应 aiohttp 会直接关闭连接，不放回连接池"""
+    async for _ in lines:
+        pass
+
+
+class AsyncOrchestrator:
+    """在独立的事件循环线程上执行夸夸流程，同一时间只处理一个任务"""
+
+    def __init__(self, system, deadline=60.0, limit_per_host=4):
+        self.system = system
+        self.deadline = deadline  # 单次夸奖（含播报）的时限(秒)
+        self.limit_per_host = limit_per_host
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+        self.session = None
+        self._jobs = None
+        self._worker = None
+        self._current = None
+        self._last_prewarm = 0.0
+        # 播放器写满时会阻塞，放到单独的线程里按顺序写入
+        self._audio_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='audio-handoff')
+
+        # 统计信息
+        self.completed = 0
+        self.cancelled = 0
+        self.timeouts = 0
+        self.failed = 0
+
+    # ---- 供其他线程调用的接口 ----
+
+    def start(self):
+        """启动事件循环线程并创建HTTP会话"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.loop.run_forever, name='asyncio-loop')
+        self.thread.daemon = True
+        self.thread.start()
+        self.run(self._setup(), timeout=5)
+
+    def run(self, coro, timeout=None):
+        """在事件循环上运行协程并等待结果（不能在事件循环线程内调用）"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def submit(self, detection):
+        """提交一次夸奖，已有任务排队时拒绝并返回 False"""
+        return self.run(self._enqueue(detection), timeout=1)
+
+    def cancel(self):
+        """取消正在进行的夸奖（如人已离开）"""
+        self.loop.call_soon_threadsafe(self._cancel_current)
+
+    def prewarm(self, urls, min_interval=30.0):
+        """在 aiohttp 会话的连接池里提前建好到各主机的连接，min_interval 秒内不重复预热（不等待结果）"""
+        now = time.monotonic()
+        if self.session is None or now - self._last_prewarm < min_interval:
+            return
+        self._last_prewarm = now
+        asyncio.run_coroutine_threadsafe(self._prewarm(urls), self.loop)
+
+    def stop(self):
+        if self.thread is None:
+            return
+        try:
+            self.run(self._shutdown(), timeout=3)
+        except Exception as e:
+            logger.warning(f"关闭事件循环出错: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1)
+        self._audio_executor.shutdown(wait=False)
+        logger.info(
+            f"asyncio 统计: 完成 {self.completed}, 取消 {self.cancelled}, "
+            f"超时 {self.timeouts}, 失败 {self.failed}"
+        )
+
+    # ---- 事件循环内部 ----
+
+    async def _setup(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=self.limit_per_host, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+        self._jobs = asyncio.Queue(maxsize=1)
+        self._worker = asyncio.create_task(self._job_worker())
+
+    async def _shutdown(self):
+        self._cancel_current()
+        if self._worker:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+        if self.session:
+            await self.session.close()
+
+    async def _prewarm(self, urls):
+        async def head(url):
+            try:
+                # 只为建立连接，响应内容不关心
+                async with self.session.head(url, timeout=aiohttp.ClientTimeout(total=3)):
+                    pass
+            except Exception as e:
+                logger.debug(f"预热连接失败 {url}: {e}")
+
+        await asyncio.gather(*(head(url) for url in urls))
+
+    async def _enqueue(self, detection):
+        try:
+            self._jobs.put_nowait(detection)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def _cancel_current(self):
+        if self._current is not None and not self._current.done():
+            self._current.cancel()
+
+    async def _job_worker(self):
+        """依次执行排队的夸奖任务"""
+        while True:
+            detection = await self._jobs.get()
+            self._current = asyncio.create_task(self._compliment(detection))
+            # 用 wait 而不是直接 await，任务被取消时不把 CancelledError 传给 worker
+            await asyncio.wait([self._current])
+            self._current = None
+
+    async def _compliment(self, detection):
+        """一次夸奖：编码 -> 上下文 -> 边生成边合成 -> 等播报完"""
+        loop = asyncio.get_running_loop()
+        system = self.system
+        start = time.monotonic()
+        state = {}
+        try:
+            async with asyncio.timeout(self.deadline):
+                image_url = await loop.run_in_executor(None, self._encode, detection, state)
+                if image_url is not None:
+                    context = await self._gather_context(detection)
+                    prompt = system.format_prompt(context, system._group_size(detection))
+
+                    sentences = asyncio.Queue()
+                    async with asyncio.TaskGroup() as group:
+                        group.create_task(self._generate(image_url, detection, prompt, sentences))
+                        group.create_task(self._speak(sentences, state))
+                elif not state.get('cached'):
+                    return
+
+                system.audio_player.finish()
+                await loop.run_in_executor(None, system.audio_player.flush, self.deadline)
+            await loop.run_in_executor(None, system._store_compliment, state)
+            self.completed += 1
+            logger.info(f"夸奖完成，耗时 {time.monotonic() - start:.2f}s")
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            system.audio_player.interrupt()
+            logger.info("夸奖已取消")
+            raise
+        except TimeoutError:
+            self.timeouts += 1
+            system.audio_player.interrupt()
+            logger.warning(f"夸奖超过时限({self.deadline}s)，已停止")
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"夸奖流程出错: {e}")
+        finally:
+            detection.release()
+            system.is_playing = False
+            system.is_processing = False
+
+    def _encode(self, detection, state):
+        """在线程池中拍高清照片并编码；命中夸奖缓存时直接播放，返回 None"""
+        source = self.system.frame_source
+        detection.set_still(source.capture_still(), source.still_format)
+        if self.system._serve_cached_compliment(state, detection):
+            return None
+        return self.system.encode_upload(detection)
+
+    async def _gather_context(self, detection):
+        """按上下文收集器中注册的来源并行获取，各自有时限，失败或超时用默认值"""
+        loop = asyncio.get_running_loop()
+        gatherer = self.system.context_gatherer
+        tasks = {}
+
+        async def run(source):
+            ctx = {'detection': detection}
+            for dep in source.depends:
+                ctx[dep] = await tasks[dep]
+            try:
+                value = await asyncio.wait_for(
+                    loop.run_in_executor(None, source.fn, ctx),
+                    min(source.deadline, gatherer.budget)
+                )
+            except TimeoutError:
+                gatherer.timeouts[source.name] += 1
+                logger.warning(f"上下文 {source.name} 超时({source.deadline}s)，使用默认值")
+                return source.default
+            except Exception as e:
+                gatherer.errors[source.name] += 1
+                logger.warning(f"上下文 {source.name} 获取失败: {e}")
+                return source.default
+            if value is None or (isinstance(value, dict) and 'error' in value):
+                return source.default
+            return value
+
+        for source in gatherer.sources.values():
+            tasks[source.name] = asyncio.ensure_future(run(source))
+        return dict(zip(tasks, await asyncio.gather(*tasks.values())))
+
+    async def _generate(self, image_url, detection, prompt, sentences):
+        """调用豆包API，每凑齐一句放入句子队列，结束时放入 None"""
+        system = self.system
+        sent = 0
+        try:
+            headers, payload = system._doubao_request(
+                image_url, detection, stream=system.stream_llm, prompt=prompt)
+            start = time.monotonic()
+            async with self.session.post(system.doubao_api_url, headers=headers, json=payload) as response:
+                response.raise_for_status()
+                if not system.stream_llm:
+                    result = await response.json()
+                    compliment = result["choices"][0]["message"]["content"].strip()
+                    logger.info(f"豆包API生成的夸夸文本: {compliment}")
+                    await sentences.put(compliment)
+                    sent += 1
+                    return
+
+                splitter = SentenceSplitter()
+                lines = _iter_lines(response)
+                async for line in lines:
+                    done, content = parse_sse_line(line)
+                    if done:
+                        await _drain(lines)
+                        break
+                    for sentence in splitter.feed(content or ''):
+                        if sent == 0:
+                            logger.info(f"豆包API首句耗时 {time.monotonic() - start:.2f}s")
+                        sent += 1
+                        logger.info(f"豆包API生成的夸夸文本: {sentence}")
+                        await sentences.put(sentence)
+                rest = splitter.flush()
+                if rest:
+                    sent += 1
+                    logger.info(f"豆包API生成的夸夸文本: {rest}")
+                    await sentences.put(rest)
+        except (aiohttp.ClientError, TimeoutError) as e:
+            logger.error(f"调用豆包API网络请求失败: {e}")
+            if sent == 0:
+                await sentences.put(system._backup_compliment())
+        finally:
+            sentences.put_nowait(None)
+
+    async def _speak(self, sentences, state):
+        """依次合成句子队列中的句子，音频交给播放器，收到 None 结束"""
+        while True:
+            sentence = await sentences.get()
+            if sentence is None:
+                break
+            self.system.is_playing = True
+            sentence = self.system._split_people(state, sentence)
+            state.setdefault('texts', []).append(sentence)
+            await self._synthesize(sentence, state)
+
+    async def _synthesize(self, text, state):
+        """调用TTS流式API，音频数据按顺序交给播放器（播放器满时在交接线程中等待）"""
+        loop = asyncio.get_running_loop()
+        system = self.system
+        audio = getattr(text, 'audio', None)
+        if audio is not None:
+            # 备用夸奖自带预合成的语音
+            await loop.run_in_executor(self._audio_executor, system.audio_player.add_audio_chunk, audio)
+            return
+        url, headers, payload = system.tts.request(text)
+        try:
+            async with self.session.post(url, headers=headers, json=payload) as response:
+                lines = _iter_lines(response)
+                async for line in lines:
+                    done, chunk_audio = system.tts.parse_line(line)
+                    if done:
+                        await _drain(lines)
+                        break
+                    if chunk_audio is not None:
+                        await loop.run_in_executor(
+                            self._audio_executor, system.audio_player.add_audio_chunk, chunk_audio)
+                        if system.use_compliment_cache:
+                            state.setdefault('audio', bytearray()).extend(chunk_audio)
+        except (aiohttp.ClientError, TimeoutError) as e:
+            logger.error(f"TTS请求失败: {e}")
+
+    # ---- 上下文缓存的加载函数（在缓存刷新线程中调用） ----
+
+    async def get_location(self):
+        system = self.system
+        url, headers = system._location_request()
+        try:
+            async with self.session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=5)) as response:
+                return system._parse_location(await response.json(content_type=None))
+        except Exception as e:
+            logger.warning(f"获取位置失败: {e}")
+            return None
+
+    async def get_current_weather(self, location):
+        system = self.system
+        url = system._weather_url(location['latitude'], location['longitude'])
+        try:
+            async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                if response.status != 200:
+                    return {"error": f"获取天气信息失败: HTTP {response.status}"}
+                return system._parse_weather(await response.json())
+        except Exception as e:
+            return {"error": f"获取天气信息失败: {e}"}
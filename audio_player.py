@@ -0,0 +1,404 @@
+"""
+流式音频播放
+TTS 送来的 PCM 数据块直接写入预分配的环形缓冲区；MP3 数据块则由解码线程（ffmpeg 子进程）
+增量解码成 PCM 再写入；
+输出线程从缓冲区取数据填进几块复用的 pygame Sound，在同一个声道上排队播放，
+上一块播完时下一块已经排好，不再逐块新建 Sound，也不再忙等 get_busy()。
+各线程之间用有界队列和条件变量交接数据，写满时阻塞上游（TTS），没有声音时不占CPU
+"""
+
+import logging
+import subprocess
+import threading
+import time
+from queue import Empty, Queue
+
+import pygame
+
+logger = logging.getLogger(__name__)
+
+
+class PcmRingBuffer:
+    """预分配的PCM字节环形缓冲区，写满时写入方阻塞"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._read = 0
+        self._size = 0
+        self._closed = False
+        self._epoch = 0  # clear() 时递增，正在阻塞的写入随之作废
+        self._cond = threading.Condition()
+        self.write_wait = 0.0  # 写入方因缓冲区满累计等待的时间(秒)
+
+    @property
+    def available(self):
+        return self._size
+
+    def write(self, data):
+        """写入数据，缓冲区满时等待读出；返回写入的字节数，期间被 clear() 时丢弃剩余部分"""
+        data = memoryview(data).cast('B')
+        written = 0
+        with self._cond:
+            epoch = self._epoch
+            while written < len(data):
+                if self._size == self.capacity and not self._closed:
+                    start_wait = time.monotonic()
+                    while self._size == self.capacity and not self._closed and epoch == self._epoch:
+                        self._cond.wait()
+                    self.write_wait += time.monotonic() - start_wait
+                if self._closed or epoch != self._epoch:
+                    break
+                n = min(self.capacity - self._size, len(data) - written)
+                start = (self._read + self._size) % self.capacity
+                first = min(n, self.capacity - start)
+                self._view[start:start + first] = data[written:written + first]
+                if n > first:
+                    self._view[:n - first] = data[written + first:written + n]
+                self._size += n
+                written += n
+                self._cond.notify_all()
+        return written
+
+    def read_into(self, out, align=1):
+        """把现有数据读进 out（不等待），读出字节数按 align 对齐；返回读出的字节数"""
+        with self._cond:
+            n = min(len(out), self._size)
+            n -= n % align
+            first = min(n, self.capacity - self._read)
+            out[:first] = self._view[self._read:self._read + first]
+            if n > first:
+                out[first:n] = self._view[:n - first]
+            self._read = (self._read + n) % self.capacity
+            self._size -= n
+            if n:
+                self._cond.notify_all()
+            return n
+
+    def wait_data(self, timeout=None, min_bytes=1):
+        """等到至少有 min_bytes 字节可读；超时返回 False，缓冲区关闭时返回是否还有剩余数据"""
+        with self._cond:
+            while self._size < min_bytes and not self._closed:
+                if not self._cond.wait(timeout):
+                    return self._size >= min_bytes
+            return self._size > 0
+
+    def wait_empty(self, timeout=None):
+        """等到数据全部被读出；超时返回 False"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._size == 0 or self._closed, timeout)
+
+    def clear(self):
+        with self._cond:
+            self._read = 0
+            self._size = 0
+            self._epoch += 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class Mp3Decoder:
+    """用 ffmpeg 子进程把连续的 MP3 数据增量解码为 s16le PCM，写入环形缓冲区"""
+
+    def __init__(self, pcm, sample_rate, channels):
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.process = None
+        self.reader = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [
+                'ffmpeg', '-loglevel', 'error',
+                # 不做输入探测和缓冲，收到一帧就解一帧
+                '-probesize', '32', '-analyzeduration', '0', '-fflags', 'nobuffer',
+                '-f', 'mp3', '-i', 'pipe:0',
+                '-f', 's16le', '-ac', str(self.channels), '-ar', str(self.sample_rate),
+                '-flush_packets', '1', 'pipe:1'
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            bufsize=0
+        )
+        self.reader = threading.Thread(target=self._reader_worker)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def feed(self, data):
+        """送入一块MP3数据"""
+        self.process.stdin.write(data)
+        self.bytes_in += len(data)
+
+    def _reader_worker(self):
+        """解码输出线程：把 ffmpeg 的输出写入PCM缓冲区"""
+        while True:
+            data = self.process.stdout.read(4096)
+            if not data:
+                break
+            self.bytes_out += len(data)
+            self.pcm.write(data)
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.terminate()
+        if self.reader:
+            self.reader.join(timeout=1)
+        self.process = None
+
+
+class StreamAudioPlayer:
+    """input_format 为 'pcm' 时输入须是 sample_rate、channels 声道的 s16le 数据，为 'mp3' 时任意采样率"""
+
+    def __init__(self, sample_rate=24000, channels=1, input_format='pcm',
+                 block_seconds=0.1, buffer_seconds=5.0, max_chunks=64):
+        self.sample_rate = sample_rate
+        self.input_format = input_format
+        # MP3 数据块队列，满了 add_audio_chunk 阻塞，TTS 读取随之放慢
+        self.audio_queue = Queue(maxsize=max_chunks)
+        self.is_running = False
+        self._lock = threading.Lock()
+        self._generation = 0  # interrupt() 时递增，队列中旧的数据块随之作废
+
+        # 整个程序只在这里初始化一次混音器，采样率与TTS输出一致，播放时不重采样
+        if pygame.mixer.get_init() not in (None, (sample_rate, -16, channels)):
+            pygame.mixer.quit()
+        pygame.mixer.init(frequency=sample_rate, size=-16, channels=channels)
+
+        # 以混音器实际的参数解码，播放时不需要再转换
+        self.mixer_rate, mixer_format, self.mixer_channels = pygame.mixer.get_init()
+        self.frame_bytes = 2 * self.mixer_channels
+        if abs(mixer_format) != 16:
+            raise RuntimeError(f"混音器需要16位格式，当前为 {mixer_format}")
+        if input_format == 'pcm' and (self.mixer_rate, self.mixer_channels) != (sample_rate, channels):
+            raise RuntimeError(
+                f"混音器参数 {self.mixer_rate}Hz/{self.mixer_channels}声道 与PCM输入不一致")
+        self.block_seconds = block_seconds
+        self.block_bytes = int(self.mixer_rate * block_seconds) * self.frame_bytes
+
+        self.pcm = PcmRingBuffer(int(self.mixer_rate * buffer_seconds) * self.frame_bytes)
+        self.decoder = Mp3Decoder(self.pcm, self.mixer_rate, self.mixer_channels)
+
+        # 三块复用的 Sound：一块在播、一块排队、一块待填充
+        pygame.mixer.set_reserved(1)
+        self.channel = pygame.mixer.Channel(0)
+        self._blocks = []
+        for _ in range(3):
+            sound = pygame.mixer.Sound(buffer=bytes(self.block_bytes))
+            samples = pygame.sndarray.samples(sound)
+            self._blocks.append((sound, samples, memoryview(samples).cast('B')))
+        self._silence = bytes(self.block_bytes)
+        self._finishing = False
+        self._in_session = False
+
+        # 统计信息
+        self.chunks = 0
+        self.max_queue_depth = 0
+        self.put_wait = 0.0  # TTS 因播放跟不上而阻塞的累计时间(秒)
+        self.max_put_wait = 0.0
+        self.blocks_played = 0
+        self.underruns = 0
+        self.interrupts = 0
+
+        self.decode_thread = None
+        self.output_thread = None
+
+    @property
+    def queue_depth(self):
+        """待解码的数据块数"""
+        return self.audio_queue.qsize()
+
+    @property
+    def is_playing(self):
+        """还有没播完的声音"""
+        return bool(self.audio_queue.qsize() or self.pcm.available or self.channel.get_busy())
+
+    def start(self):
+        """启动解码和输出线程，重复调用无副作用"""
+        with self._lock:
+            if self.is_running:
+                return
+            self.is_running = True
+            if self.input_format == 'mp3':
+                self.decoder.start()
+                self.decode_thread = threading.Thread(target=self._decode_worker)
+                self.decode_thread.daemon = True
+                self.decode_thread.start()
+            self.output_thread = threading.Thread(target=self._output_worker)
+            self.output_thread.daemon = True
+            self.output_thread.start()
+
+    def add_audio_chunk(self, audio_data):
+        """添加一块音频数据，播放跟不上时阻塞调用方
+
+        PCM 数据（bytes 或 memoryview）直接写入播放缓冲区，不经过队列和解码器
+        """
+        if not self.is_running:
+            self.start()
+        self._finishing = False
+        self.chunks += 1
+        start_wait = time.monotonic()
+        if self.input_format == 'pcm':
+            self.pcm.write(audio_data)
+        else:
+            self.audio_queue.put((self._generation, audio_data))
+            self.max_queue_depth = max(self.max_queue_depth, self.audio_queue.qsize())
+        waited = time.monotonic() - start_wait
+        self.put_wait += waited
+        self.max_put_wait = max(self.max_put_wait, waited)
+
+    def finish(self):
+        """当前这段语音的数据已经全部送入，剩下不足一块的数据也直接播放"""
+        self._finishing = True
+
+    def flush(self, timeout=None):
+        """等已送入的声音全部播完；超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.finish()
+        if self.input_format == 'mp3':
+            # 队列清空后解码器里还可能有未输出的数据，这里只能等缓冲区读空
+            while self.audio_queue.unfinished_tasks:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                time.sleep(self.block_seconds)
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not self.pcm.wait_empty(remaining):
+            return False
+        while self.channel.get_busy():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.block_seconds / 4)
+        return True
+
+    def interrupt(self):
+        """立即停止播放，丢弃所有还没播的数据（例如人已经离开）"""
+        with self._lock:
+            self._generation += 1
+            self.interrupts += 1
+            while True:
+                try:
+                    self.audio_queue.get_nowait()
+                    self.audio_queue.task_done()
+                except Empty:
+                    break
+            self.pcm.clear()
+            self.channel.stop()
+            self._in_session = False
+            if self.input_format == 'mp3' and self.is_running:
+                # 让解码线程马上重启解码器，丢掉 ffmpeg 管道里还没读出的旧数据
+                self.audio_queue.put((self._generation, None))
+
+    def _decode_worker(self):
+        """解码线程：把队列中的MP3数据块送进解码器，队列为空时阻塞"""
+        generation = self._generation
+        while True:
+            item = self.audio_queue.get()
+            try:
+                if item is None:
+                    break
+                chunk_generation, data = item
+                if chunk_generation != self._generation:
+                    continue
+                if chunk_generation != generation:
+                    # 被打断过，解码器里残留的旧数据一并丢弃
+                    self.decoder.stop()
+                    self.pcm.clear()
+                    self.decoder.start()
+                    generation = chunk_generation
+                if data is not None:
+                    self.decoder.feed(data)
+            except Exception as e:
+                logger.error(f"音频解码线程错误: {e}")
+            finally:
+                self.audio_queue.task_done()
+
+    def _output_worker(self):
+        """输出线程：从PCM缓冲区取数据，填进复用的 Sound 在同一声道排队播放
+
+        没有数据时阻塞在缓冲区的条件变量上；只有声音正在播放时才按块时长的 1/4 轮询声道
+        """
+        index = 0
+        try:
+            while self.is_running:
+                if not self.pcm.wait_data():
+                    break
+
+                # 声道的排队位还被占着，等前一块开始播放
+                if self.channel.get_queue() is not None:
+                    time.sleep(self.block_seconds / 4)
+                    continue
+
+                # 这段语音已经送完，剩下不足一个采样帧的残余数据没法播，直接丢掉，
+                # 否则缓冲区一直非空，输出线程空转、flush() 等到超时
+                available = self.pcm.available
+                if self._finishing and available < self.frame_bytes:
+                    self.pcm.read_into(bytearray(available))
+                    continue
+
+                # 这段语音还没送完时只播整块，不够一块就等数据凑齐，不用静音补齐
+                # （否则每段开头和TTS稍慢时都会插进一段静音）；
+                # 不足一个采样帧时也等，解码输出可能在采样中间被管道截断
+                if available < self.frame_bytes or (
+                        available < self.block_bytes and not self._finishing):
+                    # 带超时等待，finish() 之后能及时播出最后不足一块的数据
+                    self.pcm.wait_data(self.block_seconds / 4, min_bytes=self.block_bytes)
+                    continue
+
+                sound, _, view = self._blocks[index]
+                index = (index + 1) % len(self._blocks)
+                n = self.pcm.read_into(view, align=self.frame_bytes)
+                if n < self.block_bytes:
+                    view[n:] = self._silence[n:]
+
+                if self.channel.get_busy():
+                    self.channel.queue(sound)
+                else:
+                    if self._in_session:
+                        # 同一段语音中途断流
+                        self.underruns += 1
+                    self.channel.play(sound)
+                self._in_session = True
+                self.blocks_played += 1
+
+                if self._finishing and self.pcm.available == 0:
+                    self._in_session = False
+        except Exception as e:
+            logger.error(f"音频输出线程错误: {e}")
+
+    def stats(self):
+        return {
+            'chunks': self.chunks,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'buffered_ms': self.pcm.available / (self.mixer_rate * self.frame_bytes) * 1000,
+            'put_wait': self.put_wait,
+            'max_put_wait': self.max_put_wait,
+            'blocks_played': self.blocks_played,
+            'underruns': self.underruns,
+            'interrupts': self.interrupts,
+        }
+
+    def stop(self):
+        """停止播放并释放混音器"""
+        self.is_running = False
+        self.interrupt()
+        self.pcm.close()
+        if self.decode_thread and self.decode_thread.is_alive():
+            self.audio_queue.put(None)
+            self.decode_thread.join(timeout=1)
+        self.decoder.stop()
+        if self.output_thread and self.output_thread.is_alive():
+            self.output_thread.join(timeout=1)
+        pygame.mixer.quit()
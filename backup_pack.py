@@ -0,0 +1,128 @@
+"""
+备用夸奖资源包
+网络不通时大模型和TTS往往同时失败，备用夸奖的语音事先用 build_backup_pack.py 合成好：
+所有音频拼接成一个 pack.bin，index.json 记录每条夸奖的文本和在文件中的位置。
+启动时把 pack.bin 内存映射进来，播放时直接把映射区的切片交给播放器，不走网络也不解码
+"""
+
+import itertools
+import json
+import logging
+import mmap
+import os
+import random
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+PACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'backup')
+
+# 网络异常时使用的备用夸赞语句
+BACKUP_COMPLIMENTS = [
+    "哇!你这身搭配真是太有品味了!颜色的搭配非常和谐，整体造型既时尚又显气质，完美展现了你的个人风格!",
+    "今天的穿搭真是让人眼前一亮!服装的剪裁和配色都恰到好处，既显瘦又显高，简直是时尚达人的典范!",
+    "这套衣服真的太适合你了!简约而不简单，细节处见真章，完美衬托出你的优雅气质和时尚感!",
+    "你的穿衣风格总是这么出众!这次的搭配色彩明快，款式新颖，既显年轻活力又不失稳重，真是太棒了!"
+]
+
+# 夸奖模板：开头 + 亮点 + 结尾 组合成完整的一段
+OPENINGS = [
+    "哇！",
+    "今天的你真是让人眼前一亮！",
+    "这身搭配太有品味了！",
+    "你的穿衣风格总是这么出众！",
+    "一看就是精心搭配过的！",
+]
+HIGHLIGHTS = [
+    "颜色的搭配非常和谐，整体造型既时尚又显气质。",
+    "服装的剪裁和配色都恰到好处，既显瘦又显高。",
+    "简约而不简单，细节处见真章，衬托出你的优雅气质。",
+    "色彩明快，款式新颖，既有活力又不失稳重。",
+    "层次感做得特别好，随性里透着讲究。",
+    "整体线条干净利落，特别显精神。",
+]
+CLOSINGS = [
+    "简直是时尚达人的典范！",
+    "今天的好心情就从这身穿搭开始吧！",
+    "走在街上回头率一定超高！",
+    "完美展现了你的个人风格！",
+]
+
+
+def template_texts(count=None, seed=0):
+    """按模板组合出夸奖文本，顺序打乱但可复现；count 为 None 时返回全部组合"""
+    texts = [''.join(parts) for parts in itertools.product(OPENINGS, HIGHLIGHTS, CLOSINGS)]
+    random.Random(seed).shuffle(texts)
+    return texts if count is None else texts[:count]
+
+
+class BackupCompliment(str):
+    """带预合成音频的备用夸奖，可以当作普通文本使用；audio 为音频数据（memoryview）"""
+
+    def __new__(cls, text, audio):
+        obj = super().__new__(cls, text)
+        obj.audio = audio
+        return obj
+
+
+class BackupPack:
+    """内存映射的备用夸奖资源包"""
+
+    def __init__(self, path=PACK_DIR, avoid_recent=10):
+        self.path = path
+        self.items = []  # [(文本, 偏移, 长度)]
+        self.audio_format = None
+        self.sample_rate = None
+        self._file = None
+        self._mmap = None
+        self._view = None
+        self.recent = deque(maxlen=avoid_recent)  # 最近播过的几条不重复
+        self._load()
+
+    def _load(self):
+        index_path = os.path.join(self.path, 'index.json')
+        if not os.path.exists(index_path):
+            logger.info("未找到备用夸奖资源包，网络异常时备用夸奖需要在线合成语音")
+            return
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            self._file = open(os.path.join(self.path, 'pack.bin'), 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(self._mmap, 'madvise'):
+                # 提前读入页缓存，第一次播放不用等SD卡
+                self._mmap.madvise(mmap.MADV_WILLNEED)
+            self._view = memoryview(self._mmap)
+            self.audio_format = index['format']
+            self.sample_rate = index['sample_rate']
+            self.items = [(item['text'], item['offset'], item['length']) for item in index['items']]
+            logger.info(f"已加载备用夸奖资源包: {len(self.items)} 条, {len(self._mmap) / 1024:.0f} KB")
+        except Exception as e:
+            logger.warning(f"读取备用夸奖资源包失败: {e}")
+            self.close()
+            self.items = []
+
+    def matches(self, audio_format, sample_rate):
+        """资源包可用且音频格式与播放器一致"""
+        return bool(self.items) and (self.audio_format, self.sample_rate) == (audio_format, sample_rate)
+
+    def choose(self):
+        """随机选一条最近没播过的夸奖"""
+        candidates = [i for i in range(len(self.items)) if i not in self.recent] or range(len(self.items))
+        index = random.choice(candidates)
+        self.recent.append(index)
+        text, offset, length = self.items[index]
+        return BackupCompliment(text, self._view[offset:offset + length])
+
+    def close(self):
+        self._view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # 还有正在播放的切片引用着映射区，交给进程退出时释放
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,113 @@
+"""
+编码后端基准测试
+在录好的画面上逐个运行已注册的编码后端，分别从 BGR 和 I420 输入编码，
+输出每帧编码耗时和平均大小，用实测数据决定是否需要装 libjpeg-turbo；
+另外按常见的人物裁剪宽度（不一定是 8 的倍数）编码 I420，解码后和原图比较色差，检查平面行宽是否读对
+
+用法: python bench_encoders.py 录像目录或视频文件 [宽x高] [opencv turbojpeg]
+"""
+
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from bench_detectors import load_frames
+from image_encoders import ENCODER_BACKENDS, create_backend
+
+
+# 裁剪编码的宽高：整帧宽度掩盖不了行宽对齐的问题，这里特意包含不是 8 的倍数的宽度
+CROP_SIZES = ((340, 456), (682, 1024), (256, 384))
+
+
+def crop_frames(frames):
+    """从每帧左上角裁出 CROP_SIZES 的各个尺寸，返回 [(BGR, I420), ...]"""
+    crops = []
+    for frame in frames:
+        for width, height in CROP_SIZES:
+            if width <= frame.shape[1] and height <= frame.shape[0]:
+                image = np.ascontiguousarray(frame[:height, :width])
+                crops.append((image, cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420)))
+    return crops
+
+
+def bench(name, frames, yuv_frames, crops, quality=85):
+    """测一个后端，返回结果字典"""
+    backend = create_backend(name)
+    height, width = frames[0].shape[:2]
+
+    # 预热一次，排除库加载和首次分配的开销
+    backend.encode(frames[0], 'jpeg', quality)
+
+    start = time.perf_counter()
+    sizes = [len(backend.encode(frame, 'jpeg', quality)) for frame in frames]
+    bgr = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for yuv in yuv_frames:
+        backend.encode_i420(yuv, width, height, 'jpeg', quality)
+    i420 = time.perf_counter() - start
+
+    # 对照：I420 先整帧转 BGR 再编码（没有 YUV 编码路径时的做法）
+    start = time.perf_counter()
+    for yuv in yuv_frames:
+        backend.encode(cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR_I420), 'jpeg', quality)
+    convert = time.perf_counter() - start
+
+    # 裁剪后的 I420：解码回来和 BGR 原图比较平均色差，行宽读错时颜色错位，色差会明显变大
+    start = time.perf_counter()
+    errors = []
+    for image, yuv in crops:
+        height, width = image.shape[:2]
+        buffer = backend.encode_i420(yuv, width, height, 'jpeg', quality)
+        decoded = cv2.imdecode(np.frombuffer(buffer, np.uint8), cv2.IMREAD_COLOR)
+        errors.append(float(np.abs(decoded.astype(np.int16) - image).mean()))
+    crop = time.perf_counter() - start
+
+    return {
+        'name': name,
+        'bgr_ms': bgr / len(frames) * 1000,
+        'i420_ms': i420 / len(frames) * 1000,
+        'convert_ms': convert / len(frames) * 1000,
+        'crop_ms': crop / len(crops) * 1000 if crops else 0.0,
+        'crop_error': max(errors) if errors else 0.0,
+        'avg_kb': sum(sizes) / len(sizes) / 1024,
+    }
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    size = (1640, 1232)
+    names = sys.argv[2:]
+    if names and 'x' in names[0]:
+        width, height = names.pop(0).lower().split('x')
+        size = (int(width), int(height))
+    names = names or list(ENCODER_BACKENDS)
+    frames = load_frames(sys.argv[1], size=size, limit=50)
+    if not frames:
+        print("没有读到任何帧")
+        return
+    yuv_frames = [cv2.cvtColor(f, cv2.COLOR_BGR2YUV_I420) for f in frames]
+    crops = crop_frames(frames)
+    print(f"共 {len(frames)} 帧，分辨率 {frames[0].shape[1]}x{frames[0].shape[0]}，JPEG 质量 85")
+    print(f"裁剪尺寸: {', '.join(f'{w}x{h}' for w, h in CROP_SIZES)}（解码后最大平均色差应在几个灰度以内）")
+    print("=" * 60)
+    print(f"{'后端':<12}{'BGR(ms)':>10}{'I420(ms)':>10}{'转BGR+编码':>12}{'平均KB':>10}"
+          f"{'裁剪(ms)':>10}{'色差':>8}")
+    for name in names:
+        try:
+            r = bench(name, frames, yuv_frames, crops)
+        except Exception as e:
+            print(f"{name:<12}加载或运行失败: {e}")
+            continue
+        print(f"{r['name']:<12}{r['bgr_ms']:>10.1f}{r['i420_ms']:>10.1f}"
+              f"{r['convert_ms']:>12.1f}{r['avg_kb']:>10.0f}"
+              f"{r['crop_ms']:>10.1f}{r['crop_error']:>8.1f}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
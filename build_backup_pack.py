@@ -0,0 +1,57 @@
+"""
+构建备用夸奖资源包
+按模板生成夸奖文本，逐条调用TTS合成，音频拼接写入 pack.bin，文本和位置写入 index.json
+
+用法:
+    python build_backup_pack.py [--count 条数] [--format pcm|mp3] [--sample-rate 24000] [--out 目录]
+"""
+
+import argparse
+import json
+import os
+import time
+
+from backup_pack import BACKUP_COMPLIMENTS, PACK_DIR, template_texts
+from http_client import HttpClient, retry_policy
+from tts_client import VolcanoTTS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="构建备用夸奖资源包")
+    parser.add_argument('--count', type=int, default=40, help="模板夸奖条数（另加内置的备用夸奖）")
+    parser.add_argument('--format', choices=('pcm', 'mp3'), default='pcm', help="音频格式，需与运行时 --tts-format 一致")
+    parser.add_argument('--sample-rate', type=int, default=24000, help="采样率，需与播放器一致")
+    parser.add_argument('--out', default=PACK_DIR, help="输出目录")
+    args = parser.parse_args()
+
+    http = HttpClient()
+    http.mount('https://openspeech.bytedance.com', retry=retry_policy(retries=2, backoff=1.0, retry_post=True))
+    tts = VolcanoTTS(http, args.format, args.sample_rate)
+
+    texts = list(BACKUP_COMPLIMENTS) + template_texts(args.count)
+    os.makedirs(args.out, exist_ok=True)
+    pack_path = os.path.join(args.out, 'pack.bin')
+    items = []
+    offset = 0
+    with open(pack_path + '.tmp', 'wb') as pack:
+        for i, text in enumerate(texts, 1):
+            audio = b''.join(bytes(chunk) for chunk in tts.iter_audio(text))
+            if not audio:
+                print(f"[{i}/{len(texts)}] 合成失败，跳过: {text}")
+                continue
+            pack.write(audio)
+            items.append({'text': text, 'offset': offset, 'length': len(audio)})
+            offset += len(audio)
+            print(f"[{i}/{len(texts)}] {len(audio) / 1024:.0f} KB {text}")
+            time.sleep(0.2)  # 避免触发接口限流
+
+    index = {'format': args.format, 'sample_rate': args.sample_rate, 'items': items}
+    with open(os.path.join(args.out, 'index.json.tmp'), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+    os.replace(pack_path + '.tmp', pack_path)
+    os.replace(os.path.join(args.out, 'index.json.tmp'), os.path.join(args.out, 'index.json'))
+    print(f"完成: {len(items)} 条, 共 {offset / 1024 / 1024:.1f} MB -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
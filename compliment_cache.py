@@ -0,0 +1,241 @@
+"""
+夸奖缓存
+按穿搭的颜色直方图（人物衣着区域的 HSV 直方图）索引最近生成的夸奖文本和合成好的音频，
+同一身衣服、相近的场景（天气、时段）再次出现时直接播放缓存的夸奖，不用上传照片、等大模型和TTS。
+每身衣服保留几条不同的夸奖轮换使用，索引按最近使用时间淘汰，音频单独存文件
+"""
+
+import base64
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import cv2
+import numpy as np
+
+from regions import crop_i420
+
+logger = logging.getLogger(__name__)
+
+HIST_BINS = (16, 4, 4)  # H、S、V 分桶数，共 256 维
+HIST_RANGES = (0, 180, 0, 256, 0, 256)
+
+
+def outfit_rect(box, target, width, height):
+    """推算衣着区域 (x0, y0, x1, y1)：人脸框时取脸下方躯干（约 3 倍脸宽、4 倍脸高），人体框时取整个框"""
+    if box is None:
+        return 0, 0, width, height
+    x, y, w, h = box
+    if target == 'face':
+        x0, x1 = x - w, x + 2 * w
+        y0, y1 = y + h, y + 5 * h
+    else:
+        x0, x1, y0, y1 = x, x + w, y, y + h
+    x0, y0 = max(0, int(x0)), max(0, int(y0))
+    x1, y1 = min(width, int(x1)), min(height, int(y1))
+    if x1 - x0 < 8 or y1 - y0 < 8:
+        # 人站得太近，脸下方没有可用区域
+        return 0, 0, width, height
+    return x0, y0, x1, y1
+
+
+def outfit_region(image, box, target='face'):
+    """BGR 图中的衣着区域"""
+    height, width = image.shape[:2]
+    x0, y0, x1, y1 = outfit_rect(box, target, width, height)
+    return image[y0:y1, x0:x1]
+
+
+def outfit_embedding(image, box=None, target='face', pixel_format='BGR'):
+    """衣着区域的颜色直方图，返回开方后的单位向量，两者点积即 Bhattacharyya 系数(0-1)
+
+    pixel_format 为 'YUV420' 时在 I420 平面上裁剪缩小，只把这一小块转成 BGR
+    """
+    # 直方图对分辨率不敏感，先缩小以减少计算
+    if pixel_format == 'YUV420':
+        x0, y0, x1, y1 = outfit_rect(box, target, image.shape[1], image.shape[0] * 2 // 3)
+        scale = min(1.0, 128.0 / max(x1 - x0, y1 - y0))
+        region = crop_i420(image, (x0, y0, x1, y1), (round((x1 - x0) * scale), round((y1 - y0) * scale)))
+        region = cv2.cvtColor(region, cv2.COLOR_YUV2BGR_I420)
+    else:
+        region = outfit_region(image, box, target)
+        scale = 128.0 / max(region.shape[:2])
+        if scale < 1:
+            region = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(region, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1, 2], None, HIST_BINS, HIST_RANGES).ravel()
+    total = hist.sum()
+    if total <= 0:
+        return None
+    return np.sqrt(hist / total).astype(np.float32)
+
+
+class ComplimentCache:
+    """穿搭 -> 夸奖（文本 + 音频）的 LRU 缓存，持久化到目录"""
+
+    def __init__(self, path, threshold=0.9, max_entries=200, max_variants=3,
+                 repeat_interval=6 * 3600, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.threshold = threshold  # 颜色直方图相似度达到该值视为同一身衣服
+        self.max_entries = max_entries  # 最多记住的穿搭数
+        self.max_variants = max_variants  # 每身穿搭保留的夸奖条数
+        self.repeat_interval = repeat_interval  # 同一条夸奖两次播放的最短间隔(秒)
+        self.max_bytes = max_bytes  # 音频文件总大小上限
+        self.entries = {}
+        self.lock = threading.Lock()
+        self._matrix = None  # 各条目 embedding 组成的矩阵，查询时一次点积
+        self._ids = []
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        self._load()
+
+    def lookup(self, embedding, signature, audio_format, sample_rate):
+        """查找相似穿搭的夸奖，返回 (条目ID, 夸奖) 或 (条目ID/None, None)
+
+        夸奖为 {'text', 'audio'(bytes)}；条目存在但暂时没有可用的夸奖（都刚播过）时
+        返回条目ID，新生成的夸奖会加到这个条目下
+        """
+        if embedding is None:
+            return None, None
+        with self.lock:
+            entry_id = self._nearest(embedding, signature)
+            if entry_id is None:
+                self.misses += 1
+                return None, None
+            entry = self.entries[entry_id]
+            now = time.time()
+            variants = [v for v in entry['variants']
+                        if v['format'] == audio_format and v['sample_rate'] == sample_rate]
+            variant = min(variants, key=lambda v: v['last_served'], default=None)
+            if variant is None or now - variant['last_served'] < self.repeat_interval:
+                self.misses += 1
+                return entry_id, None
+            variant['last_served'] = now
+            entry['last_used'] = now
+        try:
+            with open(os.path.join(self.path, variant['audio']), 'rb') as f:
+                audio = f.read()
+        except OSError as e:
+            logger.warning(f"读取缓存音频失败: {e}")
+            with self.lock:
+                entry['variants'].remove(variant)
+            self._save()
+            return entry_id, None
+        self.hits += 1
+        self._save()
+        logger.info(f"命中夸奖缓存: {variant['text']}")
+        return entry_id, {'text': variant['text'], 'audio': audio}
+
+    def store(self, embedding, signature, text, audio, audio_format, sample_rate, entry_id=None):
+        """保存一条新生成的夸奖；entry_id 为 lookup 返回的相似条目"""
+        if embedding is None or not text or not audio:
+            return
+        now = time.time()
+        os.makedirs(self.path, exist_ok=True)
+        audio_name = f"{uuid.uuid4().hex}.{audio_format}"
+        with open(os.path.join(self.path, audio_name), 'wb') as f:
+            f.write(audio)
+        variant = {
+            'text': text,
+            'audio': audio_name,
+            'format': audio_format,
+            'sample_rate': sample_rate,
+            'bytes': len(audio),
+            # 刚播过，下次先轮到别的夸奖
+            'last_served': now,
+        }
+        with self.lock:
+            entry = self.entries.get(entry_id)
+            if entry is None:
+                entry_id = uuid.uuid4().hex
+                entry = {'embedding': embedding, 'signature': signature, 'variants': [], 'last_used': now}
+                self.entries[entry_id] = entry
+                self._rebuild_index()
+            entry['variants'].append(variant)
+            entry['last_used'] = now
+            removed = []
+            while len(entry['variants']) > self.max_variants:
+                removed.append(entry['variants'].pop(0))
+            removed += self._evict()
+            self.stores += 1
+        self._delete_audio(removed)
+        self._save()
+
+    def _nearest(self, embedding, signature):
+        """最相似且场景相同的条目，相似度低于阈值时返回 None"""
+        if self._matrix is None:
+            return None
+        scores = self._matrix @ embedding
+        for i in np.argsort(scores)[::-1]:
+            if scores[i] < self.threshold:
+                break
+            entry_id = self._ids[i]
+            if self.entries[entry_id]['signature'] == signature:
+                return entry_id
+        return None
+
+    def _rebuild_index(self):
+        self._ids = list(self.entries)
+        self._matrix = np.stack([self.entries[i]['embedding'] for i in self._ids]) if self._ids else None
+
+    def _evict(self):
+        """按最近使用时间淘汰条目，直到条目数和音频总大小都在上限内；返回被删除的夸奖"""
+        removed = []
+        evicted = 0
+        total = sum(v['bytes'] for e in self.entries.values() for v in e['variants'])
+        by_age = sorted(self.entries, key=lambda i: self.entries[i]['last_used'])
+        while by_age and (len(self.entries) > self.max_entries or total > self.max_bytes):
+            entry = self.entries.pop(by_age.pop(0))
+            removed += entry['variants']
+            total -= sum(v['bytes'] for v in entry['variants'])
+            evicted += 1
+        if evicted:
+            self.evictions += evicted
+            self._rebuild_index()
+        return removed
+
+    def _delete_audio(self, variants):
+        for variant in variants:
+            try:
+                os.remove(os.path.join(self.path, variant['audio']))
+            except OSError:
+                pass
+
+    def _load(self):
+        index_path = os.path.join(self.path, 'index.json')
+        if not os.path.exists(index_path):
+            return
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for entry_id, entry in data.items():
+                entry['embedding'] = np.frombuffer(base64.b64decode(entry['embedding']), dtype=np.float32)
+                self.entries[entry_id] = entry
+            self._rebuild_index()
+            logger.info(f"已加载夸奖缓存: {len(self.entries)} 身穿搭")
+        except Exception as e:
+            logger.warning(f"读取夸奖缓存失败: {e}")
+
+    def _save(self):
+        """写入索引（先写临时文件再替换）"""
+        with self.lock:
+            data = {
+                entry_id: dict(entry, embedding=base64.b64encode(entry['embedding'].tobytes()).decode('ascii'))
+                for entry_id, entry in self.entries.items()
+            }
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                index_path = os.path.join(self.path, 'index.json')
+                with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(index_path + '.tmp', index_path)
+            except Exception as e:
+                logger.warning(f"保存夸奖缓存失败: {e}")
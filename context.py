@@ -0,0 +1,95 @@
+"""
+提示词上下文收集
+天气、地点、时间、情绪等来源在线程池中并行获取，每个来源有自己的时限，
+超时或出错时用"未知"代替，慢的来源不会拖住大模型调用
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class ContextSource:
+    """一个上下文来源"""
+
+    __slots__ = ('name', 'fn', 'deadline', 'default', 'depends')
+
+    def __init__(self, name, fn, deadline, default, depends):
+        self.name = name
+        self.fn = fn  # fn(ctx) -> 值，ctx 包含 gather() 的参数和依赖来源的结果
+        self.deadline = deadline  # 从开始收集算起的时限(秒)
+        self.default = default
+        self.depends = depends
+
+
+class ContextGatherer:
+    """并行收集上下文，总耗时不超过 budget 秒"""
+
+    def __init__(self, budget=3.0, max_workers=8):
+        self.budget = budget
+        self.sources = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='context')
+
+        # 统计信息
+        self.last_timings = {}
+        self.timeouts = {}
+        self.errors = {}
+
+    def add_source(self, name, fn, deadline=2.0, default="未知", depends=()):
+        """注册来源；depends 中的来源必须先注册"""
+        for dep in depends:
+            if dep not in self.sources:
+                raise ValueError(f"上下文来源 {name} 依赖的 {dep} 尚未注册")
+        self.sources[name] = ContextSource(name, fn, deadline, default, tuple(depends))
+        self.timeouts[name] = 0
+        self.errors[name] = 0
+
+    def gather(self, **kwargs):
+        """并行获取全部来源，返回 {名字: 值}"""
+        start = time.monotonic()
+        futures = {}
+        for source in self.sources.values():
+            futures[source.name] = self.executor.submit(self._run, source, futures, kwargs, start)
+
+        results = {}
+        for name, future in futures.items():
+            source = self.sources[name]
+            deadline = start + min(source.deadline, self.budget)
+            try:
+                results[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except TimeoutError:
+                self.timeouts[name] += 1
+                logger.warning(f"上下文 {name} 超时({source.deadline}s)，使用默认值")
+                results[name] = source.default
+            except Exception as e:
+                self.errors[name] += 1
+                logger.warning(f"上下文 {name} 获取失败: {e}")
+                results[name] = source.default
+
+        logger.info(f"上下文收集耗时 {time.monotonic() - start:.2f}s")
+        return results
+
+    def _run(self, source, futures, kwargs, start):
+        """在工作线程中获取一个来源"""
+        ctx = dict(kwargs)
+        for dep in source.depends:
+            dep_source = self.sources[dep]
+            remaining = start + dep_source.deadline - time.monotonic()
+            try:
+                ctx[dep] = futures[dep].result(timeout=max(0.0, remaining))
+            except Exception:
+                ctx[dep] = None
+
+        t0 = time.monotonic()
+        value = source.fn(ctx)
+        self.last_timings[source.name] = time.monotonic() - t0
+
+        # 来源自己报告的失败也按未知处理
+        if value is None or (isinstance(value, dict) and 'error' in value):
+            return source.default
+        return value
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,171 @@
+"""
+上下文缓存
+镜子不会移动，天气也是几十分钟才变一次：位置和天气由后台线程按 TTL 定期刷新，
+过期后先继续返回旧值同时后台更新（stale-while-revalidate），
+并持久化到磁盘，重启后第一次夸奖不需要等网络
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ('loader', 'ttl', 'max_stale', 'value', 'updated')
+
+    def __init__(self, loader, ttl, max_stale):
+        self.loader = loader
+        self.ttl = ttl  # 超过该时长(秒)后台刷新
+        self.max_stale = max_stale  # 超过该时长(秒)的旧值不再使用
+        self.value = None
+        self.updated = 0.0  # 墙钟时间，便于持久化后跨重启比较
+
+
+class ContextCache:
+    """按键缓存上下文，读取只访问内存"""
+
+    def __init__(self, path=None, refresh_ahead=0.8):
+        self.path = path
+        self.refresh_ahead = refresh_ahead  # 到达 TTL 的这个比例就提前刷新
+        self.entries = {}
+        self.lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.is_running = False
+        self.thread = None
+        self._wakeup = threading.Event()
+        self._refreshing = set()
+        self._persisted = {}
+
+        # 统计信息
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+        self._load()
+
+    def register(self, key, loader, ttl, max_stale=None):
+        """注册一个缓存键，loader() 返回 None 或带 error 的字典视为失败"""
+        entry = _Entry(loader, ttl, max_stale)
+        saved = self._persisted.get(key)
+        if saved:
+            entry.value = saved['value']
+            entry.updated = saved['updated']
+        with self.lock:
+            self.entries[key] = entry
+
+    def get(self, key):
+        """读取缓存；过期时返回旧值并触发后台刷新，从未取到过时同步加载一次"""
+        entry = self.entries[key]
+        age = time.time() - entry.updated
+        if entry.value is not None and (entry.max_stale is None or age <= entry.max_stale):
+            if age <= entry.ttl:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._wakeup.set()
+            return entry.value
+
+        self.misses += 1
+        return self.refresh(key)
+
+    def peek(self, key):
+        """只读内存中的值，不触发加载（留给后台线程）；没有值或超过 max_stale 时返回 None"""
+        entry = self.entries.get(key)
+        if entry is None or entry.value is None:
+            return None
+        if entry.max_stale is not None and time.time() - entry.updated > entry.max_stale:
+            return None
+        return entry.value
+
+    def refresh(self, key):
+        """立即刷新一个键，返回最新值（失败时返回旧值）"""
+        entry = self.entries[key]
+        with self.lock:
+            if key in self._refreshing:
+                return entry.value
+            self._refreshing.add(key)
+        try:
+            value = entry.loader()
+            if value is None or (isinstance(value, dict) and 'error' in value):
+                self.refresh_errors += 1
+                logger.warning(f"刷新上下文 {key} 失败: {value}")
+                return entry.value
+            entry.value = value
+            entry.updated = time.time()
+            self.refreshes += 1
+            self._save()
+            return value
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.warning(f"刷新上下文 {key} 出错: {e}")
+            return entry.value
+        finally:
+            with self.lock:
+                self._refreshing.discard(key)
+
+    def start(self):
+        """启动后台刷新线程"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._refresh_worker)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _refresh_worker(self):
+        """后台刷新线程：按注册顺序刷新快过期的键，再睡到下一个键快过期"""
+        while self.is_running:
+            now = time.time()
+            next_due = now + 60
+            for key, entry in list(self.entries.items()):
+                due = entry.updated + entry.ttl * self.refresh_ahead
+                if entry.value is None or due <= now:
+                    self.refresh(key)
+                    due = entry.updated + entry.ttl * self.refresh_ahead
+                    if entry.value is None or due <= time.time():
+                        # 刷新失败，稍后重试
+                        due = time.time() + 30
+                next_due = min(next_due, due)
+            self._wakeup.wait(max(1.0, next_due - time.time()))
+            self._wakeup.clear()
+
+    def stop(self):
+        self.is_running = False
+        self._wakeup.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=1)
+
+    def _load(self):
+        """从磁盘读取上次保存的缓存"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._persisted = json.load(f)
+            logger.info(f"已加载上下文缓存: {', '.join(self._persisted)}")
+        except Exception as e:
+            logger.warning(f"读取上下文缓存失败: {e}")
+
+    def _save(self):
+        """写入磁盘（先写临时文件再替换，避免断电留下半个文件）"""
+        if not self.path:
+            return
+        data = {
+            key: {'value': entry.value, 'updated': entry.updated}
+            for key, entry in list(self.entries.items()) if entry.value is not None
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with self._save_lock:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"保存上下文缓存失败: {e}")
@@ -0,0 +1,324 @@
+"""
+人像检测后端
+通过名字注册和创建检测器，detect_human() 不再绑定某一种实现；
+每个后端声明自己的输入尺寸和输入格式（灰度/BGR），可以用 bench_detectors.py 实测对比
+"""
+
+import logging
+import os
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+DETECTORS = {}
+
+
+def register_detector(name):
+    """注册检测后端的装饰器"""
+    def decorator(cls):
+        cls.name = name
+        DETECTORS[name] = cls
+        return cls
+    return decorator
+
+
+def create_detector(name, **kwargs):
+    """按名字创建检测后端"""
+    if name not in DETECTORS:
+        raise ValueError(f"未知的检测后端: {name}，可选: {', '.join(DETECTORS)}")
+    return DETECTORS[name](**kwargs)
+
+
+def _to_boxes(raw, scale, width, height):
+    """把检测结果换算回原图坐标并裁剪到画面内，返回 (x, y, w, h) 整数元组列表"""
+    boxes = []
+    for x, y, w, h in raw:
+        x0 = max(0, int(round(x / scale)))
+        y0 = max(0, int(round(y / scale)))
+        x1 = min(width, int(round((x + w) / scale)))
+        y1 = min(height, int(round((y + h) / scale)))
+        if x1 > x0 and y1 > y0:
+            boxes.append((x0, y0, x1 - x0, y1 - y0))
+    return boxes
+
+
+class Person:
+    """画面中的一个人，按从左到右编号(从 1 开始)
+
+    box 为上传图像坐标下的检测框，crop 为包含躯干的裁剪图（原图视图），
+    emotion 在情绪识别后填入
+    """
+
+    __slots__ = ('detection', 'index', 'face', 'emotion')
+
+    def __init__(self, detection, index, face):
+        self.detection = detection
+        self.index = index
+        self.face = face  # 检测帧坐标下的检测框
+        self.emotion = None
+
+    @property
+    def box(self):
+        return self.detection.scale_box(self.face)
+
+
+class Detection:
+    """一次触发的检测结果，沿整个夸奖流程传递，不再重新取帧和重新检测
+
+    frame 是已占用引用的共享帧，faces 是检测帧坐标下的 (x, y, w, h)；
+    still 是触发后拍的高清照片（帧源不支持时为 None，格式为 still_format），
+    scaled_faces() 把检测框换算到上传图像的坐标；
+    people 是面积最大的 max_people 个人按从左到右排好的 Person 列表
+    """
+
+    __slots__ = ('frame', 'faces', 'target', 'still', 'still_format', 'people', '_still_bgr')
+
+    def __init__(self, frame, faces, target='face', max_people=3):
+        self.frame = frame
+        self.faces = [tuple(int(v) for v in face) for face in faces]
+        self.target = target  # 检测框框住的是人脸(face)还是整个人(person)
+        self.still = None
+        self.still_format = 'BGR'
+        self._still_bgr = None
+        largest = sorted(self.faces, key=lambda f: f[2] * f[3], reverse=True)[:max_people]
+        self.people = [Person(self, i + 1, face) for i, face in enumerate(sorted(largest))]
+
+    @property
+    def seq(self):
+        return self.frame.seq
+
+    @property
+    def timestamp(self):
+        return self.frame.timestamp
+
+    def set_still(self, still, pixel_format='BGR'):
+        """记下触发后拍的高清照片，pixel_format 为 BGR 或 YUV420"""
+        self.still = still
+        self.still_format = pixel_format
+        self._still_bgr = None
+
+    @property
+    def image(self):
+        """BGR图：优先高清照片，否则检测帧；YUV 照片在第一次用到时才转换（情绪、穿搭直方图）"""
+        if self.still is None:
+            return self.frame.bgr()
+        if self.still_format != 'YUV420':
+            return self.still
+        if self._still_bgr is None:
+            self._still_bgr = cv2.cvtColor(self.still, cv2.COLOR_YUV2BGR_I420)
+        return self._still_bgr
+
+    @property
+    def image_size(self):
+        """image 的尺寸(宽, 高)，不触发颜色转换"""
+        if self.still is None:
+            return self.frame.size
+        if self.still_format == 'YUV420':
+            return self.still.shape[1], self.still.shape[0] * 2 // 3
+        return self.still.shape[1], self.still.shape[0]
+
+    def upload_source(self):
+        """上传用的原始图像和格式 (数组, 'BGR'|'YUV420')，YUV 时不转换，交给编码器直接从平面编码"""
+        if self.still is not None:
+            return self.still, self.still_format
+        if self.frame.pixel_format == 'YUV420':
+            return self.frame.image, 'YUV420'
+        return self.frame.bgr(), 'BGR'
+
+    def scale_box(self, box):
+        """检测帧坐标下的框换算到 image 坐标"""
+        width, height = self.frame.size
+        image_width, image_height = self.image_size
+        sx, sy = image_width / width, image_height / height
+        x, y, w, h = box
+        return int(x * sx), int(y * sy), int(w * sx), int(h * sy)
+
+    def scaled_faces(self):
+        """检测框换算到 image 坐标"""
+        return [self.scale_box(face) for face in self.faces]
+
+    def largest_face(self):
+        """面积最大的检测框（image 坐标），没有时返回 None"""
+        faces = self.scaled_faces()
+        return max(faces, key=lambda f: f[2] * f[3]) if faces else None
+
+    def release(self):
+        self.frame.release()
+
+
+class Detector:
+    """检测后端接口
+
+    detect(image) 返回 (x, y, w, h) 列表；input_format 指明需要灰度图还是BGR图；
+    input_size 为检测前缩小到的最大尺寸(宽, 高)，None 表示按原尺寸检测；
+    target 表示检测的是人脸还是整个人
+    """
+
+    name = None
+    input_format = 'GRAY'
+    input_size = None
+    target = 'face'
+
+    def detect(self, image):
+        raise NotImplementedError
+
+    def detect_batch(self, images):
+        """批量检测（回放录像时使用），默认逐帧检测"""
+        return [self.detect(image) for image in images]
+
+    def _fit(self, image):
+        """按 input_size 等比缩小图像，返回 (图像, 缩放比例)"""
+        if self.input_size is None:
+            return image, 1.0
+        height, width = image.shape[:2]
+        scale = min(self.input_size[0] / width, self.input_size[1] / height)
+        if scale >= 1.0:
+            return image, 1.0
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+@register_detector('haar')
+class HaarFaceDetector(Detector):
+    """OpenCV Haar 级联人脸检测"""
+
+    input_format = 'GRAY'
+
+    def __init__(self, cascade_path=None, input_size=None, scale_factor=1.1,
+                 min_neighbors=5, min_size=(30, 30)):
+        if cascade_path is None:
+            cascade_path = self._default_cascade_path()
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise RuntimeError(f"无法加载Haar级联文件: {cascade_path}")
+        self.input_size = input_size
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    @staticmethod
+    def _default_cascade_path():
+        name = 'haarcascade_frontalface_default.xml'
+        # pip 安装的 opencv 自带级联文件，系统包则在 /usr/share/opencv4 下
+        data_dir = getattr(getattr(cv2, 'data', None), 'haarcascades', None)
+        if data_dir and os.path.exists(os.path.join(data_dir, name)):
+            return os.path.join(data_dir, name)
+        return os.path.join('/usr/share/opencv4/haarcascades', name)
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        small, scale = self._fit(image)
+        faces = self.cascade.detectMultiScale(
+            small,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=self.min_size
+        )
+        return _to_boxes(faces, scale, width, height)
+
+
+@register_detector('yunet')
+class YuNetFaceDetector(Detector):
+    """OpenCV YuNet 人脸检测（cv2.FaceDetectorYN，需要 OpenCV >= 4.8）"""
+
+    input_format = 'BGR'
+
+    def __init__(self, model_path=None, input_size=(320, 240), score_threshold=0.8,
+                 nms_threshold=0.3):
+        if model_path is None:
+            model_path = os.path.join(MODEL_DIR, 'face_detection_yunet_2023mar.onnx')
+        self.input_size = input_size
+        self.model = cv2.FaceDetectorYN.create(
+            model_path, "", input_size, score_threshold, nms_threshold
+        )
+        self._model_size = tuple(input_size)
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        small, scale = self._fit(image)
+        size = (small.shape[1], small.shape[0])
+        if size != self._model_size:
+            # 跟踪时输入的是局部区域，尺寸每次不同
+            self.model.setInputSize(size)
+            self._model_size = size
+        _, faces = self.model.detect(small)
+        if faces is None:
+            return []
+        return _to_boxes((face[:4] for face in faces), scale, width, height)
+
+
+@register_detector('dnn')
+class DnnFaceDetector(Detector):
+    """OpenCV DNN 人脸检测（ResNet-10 SSD），支持批量推理"""
+
+    input_format = 'BGR'
+
+    def __init__(self, prototxt_path=None, weights_path=None, input_size=(300, 300),
+                 confidence=0.6, batch_size=8):
+        if prototxt_path is None:
+            prototxt_path = os.path.join(MODEL_DIR, 'deploy.prototxt')
+        if weights_path is None:
+            weights_path = os.path.join(MODEL_DIR, 'res10_300x300_ssd_iter_140000.caffemodel')
+        self.net = cv2.dnn.readNetFromCaffe(prototxt_path, weights_path)
+        self.input_size = input_size
+        self.confidence = confidence
+        self.batch_size = batch_size
+
+    def detect(self, image):
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, images):
+        """每 batch_size 帧拼成一个 blob 做一次前向推理"""
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            chunk = images[start:start + self.batch_size]
+            blob = cv2.dnn.blobFromImages(chunk, 1.0, self.input_size, (104.0, 177.0, 123.0))
+            self.net.setInput(blob)
+            # 输出形状 (1, 1, N, 7)，第0列是该检测所属的帧在批内的序号
+            detections = self.net.forward()
+            boxes = [[] for _ in chunk]
+            for det in detections[0, 0]:
+                index = int(det[0])
+                if det[2] < self.confidence or not 0 <= index < len(chunk):
+                    continue
+                height, width = chunk[index].shape[:2]
+                x0, y0 = det[3] * width, det[4] * height
+                x1, y1 = det[5] * width, det[6] * height
+                boxes[index].extend(_to_boxes([(x0, y0, x1 - x0, y1 - y0)], 1.0, width, height))
+            results.extend(boxes)
+        return results
+
+
+@register_detector('hog')
+class HogPersonDetector(Detector):
+    """OpenCV HOG + SVM 行人检测（检测整个人而不是人脸）"""
+
+    input_format = 'GRAY'
+    target = 'person'
+    window_size = (64, 128)
+
+    def __init__(self, input_size=(320, 240), win_stride=(8, 8), scale=1.05, hit_threshold=0.0):
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        self.input_size = input_size
+        self.win_stride = win_stride
+        self.scale = scale
+        self.hit_threshold = hit_threshold
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        small, scale = self._fit(image)
+        if small.shape[1] < self.window_size[0] or small.shape[0] < self.window_size[1]:
+            # 小于检测窗口
+            return []
+        rects, _ = self.hog.detectMultiScale(
+            small,
+            hitThreshold=self.hit_threshold,
+            winStride=self.win_stride,
+            padding=(8, 8),
+            scale=self.scale
+        )
+        return _to_boxes(rects, scale, width, height)
@@ -0,0 +1,277 @@
+"""
+情绪识别
+启动时在后台加载 DeepFace 情绪模型并用一张空白人脸预热，第一次夸奖不用等模型加载；
+直接在检测循环找到的人脸区域上推理（跳过 DeepFace 自带的人脸检测），
+结果按人（检测框位置相近即视为同一人）缓存几秒，短时间内重复触发不重复推理。
+EmotionTracker 在检测循环看到人脸时就在后台推理，多帧结果取平均，触发夸奖时直接读取
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _normalized(box, width, height):
+    x, y, w, h = box
+    return x / width, y / height, w / width, h / height
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0.0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0.0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class EmotionResult:
+    """一次情绪识别的结果"""
+
+    __slots__ = ('dominant', 'scores', 'timestamp')
+
+    def __init__(self, dominant, scores):
+        self.dominant = dominant
+        self.scores = scores  # {情绪: 概率(0-1)}
+        self.timestamp = time.monotonic()
+
+
+class EmotionRecognizer:
+    """预加载的情绪识别器，按人缓存结果"""
+
+    def __init__(self, cache_ttl=10.0, match_iou=0.3, margin=0.25):
+        self.cache_ttl = cache_ttl  # 同一人的结果在该时长(秒)内直接复用
+        self.match_iou = match_iou  # 检测框重叠度达到该值视为同一人
+        self.margin = margin  # 裁剪人脸时四周留出的边（相对框宽高）
+        self.ready = threading.Event()
+        self.load_error = None
+        self._lock = threading.Lock()  # 模型不保证线程安全，推理串行
+        self._cache = []  # [(归一化检测框, EmotionResult)]
+        self._deepface = None
+
+        # 统计信息
+        self.inferences = 0
+        self.cache_hits = 0
+        self.total_time = 0.0
+        self.load_time = 0.0
+
+    def start(self):
+        """在后台线程加载并预热模型"""
+        thread = threading.Thread(target=self._load, name='emotion-load')
+        thread.daemon = True
+        thread.start()
+
+    def _load(self):
+        start = time.monotonic()
+        try:
+            from deepface import DeepFace
+            self._deepface = DeepFace
+            # 用一张空白人脸跑一次，模型加载和首次推理的开销都在这里付掉
+            with self._lock:
+                self._analyze(np.zeros((48, 48, 3), dtype=np.uint8))
+            self.load_time = time.monotonic() - start
+            logger.info(f"情绪模型已加载，耗时 {self.load_time:.1f}s")
+        except Exception as e:
+            self.load_error = e
+            logger.error(f"情绪模型加载失败: {e}")
+        finally:
+            self.ready.set()
+
+    def _analyze(self, image, detector_backend='skip'):
+        result = self._deepface.analyze(
+            img_path=image,
+            actions=['emotion'],
+            detector_backend=detector_backend,
+            enforce_detection=False,
+            align=detector_backend != 'skip',
+            silent=True
+        )
+        result = result[0]
+        total = sum(result['emotion'].values()) or 1.0
+        scores = {name: value / total for name, value in result['emotion'].items()}
+        return EmotionResult(result['dominant_emotion'], scores)
+
+    def crop(self, image, box):
+        """按检测框裁出人脸，四周留一点边"""
+        x, y, w, h = box
+        mx, my = int(w * self.margin), int(h * self.margin)
+        return image[max(0, y - my):y + h + my, max(0, x - mx):x + w + mx]
+
+    def cached(self, box, width, height):
+        """同一人在缓存有效期内的结果，没有时返回 None"""
+        key = _normalized(box, width, height)
+        now = time.monotonic()
+        with self._lock:
+            self._cache = [(k, r) for k, r in self._cache if now - r.timestamp <= self.cache_ttl]
+            best = max(self._cache, key=lambda item: _iou(item[0], key), default=None)
+        if best is not None and _iou(best[0], key) >= self.match_iou:
+            return best[1]
+        return None
+
+    def recognize(self, image, box=None, is_face=True, timeout=5.0):
+        """识别情绪，返回 EmotionResult；模型不可用时返回 None
+
+        box 为人脸框时直接在裁剪区域上推理；box 为人体框或没有框时交给 DeepFace 自己找人脸
+        """
+        if not self.ready.wait(timeout) or self.load_error is not None:
+            return None
+        height, width = image.shape[:2]
+        if box is not None and is_face:
+            result = self.cached(box, width, height)
+            if result is not None:
+                self.cache_hits += 1
+                return result
+
+        region = self.crop(image, box) if box is not None else image
+        result = self.analyze(region, is_face=box is not None and is_face)
+
+        if box is not None and is_face:
+            with self._lock:
+                self._cache.append((_normalized(box, width, height), result))
+        return result
+
+    def analyze(self, region, is_face=True):
+        """在已裁好的区域上推理（不查缓存）；is_face 为 False 时让 DeepFace 自己找人脸"""
+        start = time.monotonic()
+        with self._lock:
+            result = self._analyze(region, 'skip' if is_face else 'opencv')
+        self.total_time += time.monotonic() - start
+        self.inferences += 1
+        return result
+
+    def stats(self):
+        return {
+            'inferences': self.inferences,
+            'cache_hits': self.cache_hits,
+            'avg_ms': self.total_time / self.inferences * 1000 if self.inferences else 0.0,
+            'load_s': self.load_time,
+        }
+
+
+class EmotionTracker:
+    """推测式情绪识别：检测循环看到人脸时把每个人的人脸区域交给后台线程推理，
+    每个人最近几帧的概率取平均作为当前情绪，生成提示词时直接读取，不占用夸奖的关键路径
+
+    人按检测框位置区分（重叠度达到 match_iou 视为同一人）；只保留最新一批待处理，推理跟不上时旧的直接丢弃
+    """
+
+    def __init__(self, recognizer, interval=0.5, window=5, max_age=5.0, match_iou=0.3):
+        self.recognizer = recognizer
+        self.interval = interval  # 两次推理的最短间隔(秒)
+        self.window = window  # 每个人参与平均的最近结果数
+        self.max_age = max_age  # 超过该时长(秒)的结果不再参与平均（人大概已经换了）
+        self.match_iou = match_iou
+        self.tracks = []  # [(归一化检测框, deque[EmotionResult])]
+        self.is_running = False
+        self.thread = None
+        self._pending = None  # 待推理的 [(归一化检测框, 人脸区域)]（已拷贝，不占用共享帧）
+        self._last_offer = 0.0
+        self._cond = threading.Condition()
+
+        # 统计信息
+        self.offered = 0
+        self.dropped = 0
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._worker, name='emotion-tracker')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def offer(self, frame, boxes):
+        """检测循环调用：把帧中各人的人脸区域交给后台推理，距上次不足 interval 秒时忽略"""
+        if not self.is_running or not self.recognizer.ready.is_set() or self.recognizer.load_error:
+            return
+        now = time.monotonic()
+        if now - self._last_offer < self.interval:
+            return
+        self._last_offer = now
+        # YUV 帧直接从 Y 平面裁剪，情绪模型本来就只看灰度，整帧不用转BGR
+        image = frame.image if frame.pixel_format == 'BGR' else frame.gray
+        width, height = frame.size
+        regions = [(_normalized(box, width, height), self.recognizer.crop(image, box).copy()) for box in boxes]
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += len(self._pending)
+            self._pending = regions
+            self.offered += len(regions)
+            self._cond.notify()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self.is_running and self._pending is None:
+                    self._cond.wait()
+                if not self.is_running:
+                    break
+                regions, self._pending = self._pending, None
+            for key, region in regions:
+                if region.ndim == 2:
+                    region = cv2.cvtColor(region, cv2.COLOR_GRAY2BGR)
+                try:
+                    result = self.recognizer.analyze(region)
+                except Exception as e:
+                    logger.warning(f"后台情绪识别失败: {e}")
+                    continue
+                self._add(key, result)
+
+    def _add(self, key, result):
+        with self._cond:
+            now = time.monotonic()
+            self.tracks = [(k, r) for k, r in self.tracks if r and now - r[-1].timestamp <= self.max_age]
+            best = max(self.tracks, key=lambda track: _iou(track[0], key), default=None)
+            if best is not None and _iou(best[0], key) >= self.match_iou:
+                self.tracks.remove(best)
+                results = best[1]
+            else:
+                results = deque(maxlen=self.window)
+            results.append(result)
+            self.tracks.append((key, results))
+
+    def latest(self, box, width, height):
+        """检测框 box（在 width x height 的图像中）所对应的人最近几帧概率平均后的情绪，
+        没有新近结果时返回 None
+        """
+        key = _normalized(box, width, height)
+        now = time.monotonic()
+        with self._cond:
+            best = max(self.tracks, key=lambda track: _iou(track[0], key), default=None)
+            if best is None or _iou(best[0], key) < self.match_iou:
+                recent = []
+            else:
+                recent = [r for r in best[1] if now - r.timestamp <= self.max_age]
+        if not recent:
+            self.misses += 1
+            return None
+        self.hits += 1
+        scores = {}
+        for result in recent:
+            for name, value in result.scores.items():
+                scores[name] = scores.get(name, 0.0) + value / len(recent)
+        return EmotionResult(max(scores, key=scores.get), scores)
+
+    def stop(self):
+        with self._cond:
+            self.is_running = False
+            self._cond.notify()
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def stats(self):
+        return {
+            'offered': self.offered,
+            'dropped': self.dropped,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
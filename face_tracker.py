@@ -0,0 +1,169 @@
+"""
+跟踪辅助的人脸检测
+找到人脸后，后续帧只在上一次人脸框周围的扩展区域内检测，
+区域内检测失败时用模板匹配顶上；每隔 N 帧或跟丢时才做一次全画面检测
+"""
+
+import logging
+import time
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+def _expand(box, margin, width, height):
+    """把人脸框向四周扩展 margin 倍，返回裁剪到画面内的 (x0, y0, x1, y1)"""
+    x, y, w, h = box
+    dx, dy = int(w * margin), int(h * margin)
+    return max(0, x - dx), max(0, y - dy), min(width, x + w + dx), min(height, y + h + dy)
+
+
+def _iou(a, b):
+    """两个 (x, y, w, h) 框的交并比"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class _Track:
+    __slots__ = ('box', 'template', 'coasting')
+
+    def __init__(self, box, template):
+        self.box = box
+        self.template = template
+        self.coasting = 0  # 连续靠模板匹配维持的帧数
+
+
+class TrackingFaceDetector:
+    """跟踪辅助的人脸检测器
+
+    detect_fn(image) 返回 (x, y, w, h) 列表，既用于全画面检测也用于局部区域检测；
+    输入可以是灰度图或BGR图，取决于检测后端。
+    enabled=False 时每帧都做全画面检测，便于和跟踪模式对比
+    """
+
+    def __init__(self, detect_fn, full_scan_interval=15, roi_margin=0.5,
+                 match_threshold=0.6, max_coast=5, enabled=True):
+        self.detect_fn = detect_fn
+        self.full_scan_interval = full_scan_interval  # 每隔多少帧强制全画面检测
+        self.roi_margin = roi_margin  # 局部检测区域相对人脸框的扩展比例
+        self.match_threshold = match_threshold  # 模板匹配的最低相关系数
+        self.max_coast = max_coast  # 最多连续几帧只靠模板匹配
+        self.enabled = enabled
+        self.tracks = []
+        self._last_full_scan = 0
+
+        # 统计信息
+        self.frame_count = 0
+        self.full_scans = 0
+        self.roi_scans = 0
+        self.template_hits = 0
+        self.detect_time = 0.0
+        self.cpu_time = 0.0
+        self._start_time = None
+
+    def detect(self, gray):
+        """检测一帧，返回人脸框列表"""
+        start_wall = time.perf_counter()
+        # 进程CPU时间，包含 OpenCV 内部的并行线程
+        start_cpu = time.process_time()
+        if self._start_time is None:
+            self._start_time = start_wall
+
+        self.frame_count += 1
+        if (not self.enabled or not self.tracks
+                or self.frame_count - self._last_full_scan >= self.full_scan_interval):
+            faces = self._full_scan(gray)
+        else:
+            faces = self._track(gray)
+            if not faces:
+                # 全部跟丢，立即全画面重扫
+                faces = self._full_scan(gray)
+
+        self.detect_time += time.perf_counter() - start_wall
+        self.cpu_time += time.process_time() - start_cpu
+        return faces
+
+    def reset(self):
+        """清除跟踪状态，下一帧做全画面检测"""
+        self.tracks = []
+
+    def _crop(self, gray, box):
+        x, y, w, h = box
+        # 模板需要在帧被覆盖后继续使用，必须拷贝
+        return gray[y:y + h, x:x + w].copy()
+
+    def _full_scan(self, gray):
+        self.full_scans += 1
+        self._last_full_scan = self.frame_count
+        boxes = [tuple(int(v) for v in face) for face in self.detect_fn(gray)]
+        if self.enabled:
+            self.tracks = [_Track(box, self._crop(gray, box)) for box in boxes]
+        return boxes
+
+    def _match(self, roi, template, x0, y0):
+        """在局部区域内做模板匹配，失败返回 None"""
+        th, tw = template.shape[:2]
+        if roi.shape[0] < th or roi.shape[1] < tw:
+            return None
+        result = cv2.matchTemplate(roi, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (mx, my) = cv2.minMaxLoc(result)
+        if score < self.match_threshold:
+            return None
+        return (mx + x0, my + y0, tw, th)
+
+    def _track(self, gray):
+        height, width = gray.shape[:2]
+        boxes = []
+        tracks = []
+        for track in self.tracks:
+            x0, y0, x1, y1 = _expand(track.box, self.roi_margin, width, height)
+            roi = gray[y0:y1, x0:x1]
+            self.roi_scans += 1
+            found = [(int(x) + x0, int(y) + y0, int(w), int(h)) for (x, y, w, h) in self.detect_fn(roi)]
+
+            if found:
+                box = max(found, key=lambda b: _iou(b, track.box))
+                track.coasting = 0
+                track.template = self._crop(gray, box)
+            else:
+                if track.coasting >= self.max_coast:
+                    continue
+                box = self._match(roi, track.template, x0, y0)
+                if box is None:
+                    continue
+                # 模板只在检测确认时更新，避免漂移
+                track.coasting += 1
+                self.template_hits += 1
+
+            # 相邻人脸的扩展区域可能重叠，去掉重复结果
+            if any(_iou(box, other) > 0.3 for other in boxes):
+                continue
+            track.box = box
+            boxes.append(box)
+            tracks.append(track)
+
+        self.tracks = tracks
+        return boxes
+
+    def stats(self):
+        """检测统计，用于和全画面检测对比"""
+        frames = self.frame_count
+        elapsed = time.perf_counter() - self._start_time if self._start_time else 0.0
+        return {
+            'frames': frames,
+            'fps': frames / elapsed if elapsed > 0 else 0.0,
+            'detect_fps': frames / self.detect_time if self.detect_time > 0 else 0.0,
+            'avg_ms': self.detect_time / frames * 1000 if frames else 0.0,
+            'cpu_ms': self.cpu_time / frames * 1000 if frames else 0.0,
+            'cpu_percent': self.cpu_time / elapsed * 100 if elapsed > 0 else 0.0,
+            'full_scans': self.full_scans,
+            'roi_scans': self.roi_scans,
+            'template_hits': self.template_hits,
+        }
@@ -7,101 +7,136 @@
 import cv2
 import numpy as np
 import requests
-import json
-import base64
 import time
-import pygame
-import io
 import logging
-import threading
+import argparse
+import os
 from datetime import datetime
-from deepface import DeepFace
-from picamera2 import Picamera2, MappedArray
-from libcamera import Transform
-from threading import Thread, Lock
-from collections import deque
+from threading import Lock
+from frame_buffer import FrameRingBuffer, FrameGrabber
+from frame_source import Picamera2Source, create_frame_source
+from face_tracker import TrackingFaceDetector
+from detectors import Detection, create_detector
+from motion_gate import MotionGate
+from scheduler import DetectionScheduler, IDLE, PRESENT, COOLDOWN, BUSY
+from context import ContextGatherer
+from context_cache import ContextCache
+from http_client import HttpClient, retry_policy
+from llm_stream import iter_sentences, split_person_tags
+from audio_player import StreamAudioPlayer
+from tts_client import VolcanoTTS
+from backup_pack import BACKUP_COMPLIMENTS, BackupCompliment, BackupPack
+from emotion import EmotionRecognizer, EmotionTracker
+from upload_encoder import UploadEncoder
+from pipeline import Pipeline
+from compliment_cache import ComplimentCache, outfit_embedding
+
+# 缓存目录（上下文缓存等）
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class StreamAudioPlayer:
-    def __init__(self, sample_rate=4000):
-        self.sample_rate = sample_rate
-        self.audio_queue = deque()
-        self.is_playing = False
-        self.play_thread = None
-        pygame.mixer.init(frequency=sample_rate)
-    
-    def add_audio_chunk(self, audio_data):
-        """添加音频数据块到队列"""
-        self.audio_queue.append(audio_data)
-        if not self.is_playing:
-            self.start_playback()
-    
-    def start_playback(self):
-        """开始播放音频"""
-        if self.play_thread is None or not self.play_thread.is_alive():
-            self.play_thread = threading.Thread(target=self._playback_worker)
-            self.play_thread.daemon = True
-            self.play_thread.start()
-    
-    def _playback_worker(self):
-        """音频播放工作线程"""
-        self.is_playing = True
-        try:
-            while self.audio_queue or self.is_playing:
-                if self.audio_queue:
-                    audio_data = self.audio_queue.popleft()
-                    
-                    # 创建临时内存文件来播放音频
-                    audio_buffer = io.BytesIO(audio_data)
-                    try:
-                        sound = pygame.mixer.Sound(audio_buffer)
-                        sound.play()
-                        
-                        # 等待当前音频块播放完成
-                        while pygame.mixer.get_busy():
-                            pygame.time.wait(1)
-                            
-                    except pygame.error as e:
-                        print(f"播放音频块时出错: {e}")
-                    finally:
-                        audio_buffer.close()
-                else:
-                    # 队列为空，短暂等待
-                    pygame.time.wait(5)
-        except Exception as e:
-            print(f"音频播放线程错误: {e}")
-        finally:
-            self.is_playing = False
-    
-    def stop(self):
-        """停止播放"""
-        self.is_playing = False
-        if self.play_thread and self.play_thread.is_alive():
-            self.play_thread.join(timeout=1)
-        pygame.mixer.quit()
-
 class FashionComplimentSystem:
-    def __init__(self):
+    def __init__(self, frame_source=None, drop_stale=True, still_size=(1640, 1232), jpeg_quality=90,
+                 detector='haar', tts_format='pcm', runtime='threads', encoder_backend='auto'):
         
         
         # 摄像头配置
-        self.picam2 = None
+        self.frame_source = frame_source
         self.is_detecting = False
         self.last_detection_time = 0
         self.detection_cooldown = 45  # 检测冷却时间(秒)
+        self.frame_size = (320, 240)  # 检测流(lores)分辨率(宽, 高)
+        self.capture_format = 'YUV420'  # 采集格式：YUV420（检测直接用Y平面）或 BGR
+        self.still_size = still_size  # 上传给大模型的高清照片分辨率，None 表示直接上传检测帧
+        self.jpeg_quality = jpeg_quality  # 上传照片的最高JPEG质量
+        # 上传编码：裁到人物、限制长边、按大小上限自动选质量
+        self.upload_encoder = UploadEncoder(max_quality=jpeg_quality, backend=encoder_backend)
+        # 多人同时出现时把每个人的照片放进同一次请求，分别夸奖后依次播报
+        self.batch_people = True
+        self.max_people = 3  # 一次最多夸几个人（取画面中最大的几个）
+        
+        # 帧缓冲配置
+        self.frame_buffer = FrameRingBuffer(capacity=4, max_age=0.5, drop_stale=drop_stale)
+        self.frame_grabber = None
+        self.show_preview = True  # 是否显示检测画面
         
         # 人像检测配置
-        self.face_cascade = None
-        self.body_cascade = None
+        self.detector_name = detector  # 检测后端：haar / yunet / dnn / hog
+        self.detector = None
+        self.face_detector = None
+        self.use_tracking = True  # 人脸跟踪；关闭后每帧全画面检测（用于对比）
+        self.motion_gate = MotionGate()  # 画面静止时跳过人脸检测
+        self.scheduler = DetectionScheduler()  # 按系统状态调整检测频率
+        self.is_processing = False  # 是否有夸奖流程正在进行
+        self.leave_timeout = 10.0  # 夸奖进行中人离开超过该时长(秒)则取消
+        self.last_seen = 0
+        self._cancel_requested = False
         self.detection_lock = Lock()
         
-        # 语音播放配置
-        pygame.mixer.init()
+        # 豆包API配置
+        self.doubao_api_url = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
+        self.doubao_api_key = "123"  # 需要替换为实际的API密钥
+        self.doubao_model = "doubao-seed-1-6-251015"  # 根据实际模型名称调整
+        self.stream_llm = True  # 流式生成，每凑齐一句就开始合成语音
+        
+        # 共享HTTP长连接：按主机设置重试策略，启动和有人靠近时预热
+        self.http = HttpClient()
+        self.http.mount('https://ark.cn-beijing.volces.com', retry=retry_policy(retries=2, backoff=0.5, retry_post=True))
+        self.http.mount('https://openspeech.bytedance.com', retry=retry_policy(retries=1, backoff=0.2, retry_post=True))
+        self.http.mount('https://api.ip.sb', retry=retry_policy(retries=2), prewarm=False)
+        self.http.mount('https://api.openweathermap.org', retry=retry_policy(retries=2), prewarm=False)
+        
+        # 位置和天气缓存：后台定期刷新并保存到磁盘，夸奖时只读内存
+        self.context_cache = ContextCache(path=os.path.join(CACHE_DIR, 'context.json'))
+        self.context_cache.register('location', self._load_location, ttl=24 * 3600)
+        self.context_cache.register('weather', self._load_weather, ttl=15 * 60, max_stale=6 * 3600)
+        
+        # 情绪识别：启动时后台加载并预热模型
+        self.emotion = EmotionRecognizer()
+        # 看到人脸就在后台推理情绪，触发夸奖时直接读取多帧平均的结果
+        self.speculative_emotion = True
+        self.emotion_tracker = EmotionTracker(self.emotion)
+        
+        # 提示词上下文：各来源并行获取，总时限内拿不到的按"未知"处理
+        self.context_budget = 3.0  # 收集上下文的总时限(秒)
+        self.context_gatherer = ContextGatherer(budget=self.context_budget)
+        self.context_gatherer.add_source('location', lambda ctx: self.context_cache.get('location'), deadline=2.0)
+        self.context_gatherer.add_source('weather', lambda ctx: self.context_cache.get('weather'), deadline=3.0)
+        self.context_gatherer.add_source('time', lambda ctx: self.get_time(), deadline=0.5)
+        self.context_gatherer.add_source('emotion', lambda ctx: self.emotion_recognition(ctx['detection']), deadline=3.0)
+        
+        # 语音播放配置：TTS 默认直接输出PCM，混音器以同一采样率初始化，不解码也不重采样
+        self.tts_format = tts_format  # pcm 或 mp3
+        self.tts_sample_rate = 24000  # TTS输出和混音器的采样率
         self.is_playing = False
-        self.audio_player = StreamAudioPlayer(sample_rate=4000)
+        self.audio_player = StreamAudioPlayer(sample_rate=self.tts_sample_rate, input_format=tts_format)
+        self.tts = VolcanoTTS(self.http, tts_format, self.tts_sample_rate)
+        
+        # 夸奖缓存：同一身衣服、相近场景再次出现时直接播放缓存的夸奖
+        self.use_compliment_cache = True
+        self.compliment_cache = ComplimentCache(os.path.join(CACHE_DIR, 'compliments'))
+        
+        # 备用夸奖资源包：预合成的语音内存映射进来，断网时立即播放
+        self.backup_pack = BackupPack()
+        
+        # 夸夸流水线：编码 -> 上下文 -> 大模型 -> TTS -> 播放，各阶段独立线程和有界队列
+        # TTS 和播放需要保持句子和音频块的顺序，只能单线程
+        self.pipeline = Pipeline(on_done=self._on_compliment_done)
+        self.pipeline.add_stage('encode', self._stage_encode, queue_size=1)
+        self.pipeline.add_stage('context', self._stage_context)
+        self.pipeline.add_stage('llm', self._stage_llm)
+        self.pipeline.add_stage('tts', self._stage_tts, queue_size=8)
+        self.pipeline.add_stage('playback', self._stage_playback, queue_size=32)
+        
+        # asyncio 运行模式：网络请求改由一个事件循环线程以协程执行，代替流水线
+        self.runtime = runtime  # threads 或 asyncio
+        self.orchestrator = None
+        if runtime == 'asyncio':
+            from async_orchestrator import AsyncOrchestrator
+            self.orchestrator = AsyncOrchestrator(self)
         
         # 初始化组件
         self._initialize_components()
@@ -109,18 +144,36 @@ class FashionComplimentSystem:
     def _initialize_components(self):
         """初始化各个组件"""
         try:
-            # 初始化摄像头
-            self.picam2 = Picamera2()
-            config = self.picam2.create_preview_configuration(
-                main={"size": (640, 480)},
-                controls={"FrameRate": 30},
-                transform=Transform(hflip=True, vflip=True)
+            # 初始化帧源（默认树莓派摄像头）
+            if self.frame_source is None:
+                self.frame_source = Picamera2Source(
+                    size=self.frame_size,
+                    pixel_format=self.capture_format,
+                    still_size=self.still_size
+                )
+            self.frame_source.open()
+            
+            # 预分配帧缓冲，启动后由取帧线程填充
+            self.frame_buffer.allocate(
+                self.frame_source.shape,
+                self.frame_source.dtype,
+                self.frame_source.pixel_format
             )
-            self.picam2.configure(config)
+            self.frame_grabber = FrameGrabber(self.frame_source, self.frame_buffer)
             
+            # 开机即在后台刷新位置和天气，并预热大模型和TTS的连接
+            if self.orchestrator:
+                self.orchestrator.start()
+            else:
+                self.pipeline.start()
+            self.context_cache.start()
+            self._prewarm_connections()
+            self.emotion.start()
+            self.emotion_tracker.start()
             
-            cascade_path = r'/usr/share/opencv4/haarcascades/haarcascade_frontalface_default.xml' 
-            self.face_cascade = cv2.CascadeClassifier(cascade_path)
+            self.detector = create_detector(self.detector_name)
+            self.face_detector = TrackingFaceDetector(self.detector.detect, enabled=self.use_tracking)
+            logger.info(f"检测后端: {self.detector_name}")
             
             logger.info("系统初始化完成")
             
@@ -128,65 +181,107 @@ class FashionComplimentSystem:
             logger.error(f"初始化失败: {e}")
             raise
     
-    def detect_human(self, frame):
-        """检测画面中是否有人"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # 面部检测
-        faces = self.face_cascade.detectMultiScale(
-            gray, 
-            scaleFactor=1.1, 
-            minNeighbors=5, 
-            minSize=(30, 30)
-        )
+    def _detector_input(self, frame):
+        """按检测后端的要求取灰度图（YUV 下零拷贝）或 BGR 图"""
+        if self.detector.input_format == 'GRAY':
+            return frame.gray
+        return frame.bgr()
+    
+    def detect_human(self, image):
+        """检测画面中是否有人，返回 (是否有人, 人脸框列表)"""
+        # 面部检测（跟踪辅助，大部分帧只扫描人脸附近区域）
+        faces = self.face_detector.detect(image)
         
         human_detected = len(faces) > 0 
-        
-        # 在画面上绘制检测结果
-        for (x, y, w, h) in faces:
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-            cv2.putText(frame, 'Face', (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
     
-        return human_detected, frame
+        return human_detected, faces
     
-    def capture_image(self):
-        """捕获当前画面"""
-        try:
-            # 使用picamera2捕获图像
-            array = self.picam2.capture_array()
-            # 转换为BGR格式用于OpenCV处理
-            frame = cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
-            return True, frame
-        except Exception as e:
-            logger.error(f"捕获图像失败: {e}")
+    def _draw_detections(self, gray, faces):
+        """在画面副本上绘制检测结果（共享帧不能直接修改）"""
+        display_frame = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        for (x, y, w, h) in faces:
+            cv2.rectangle(display_frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+            cv2.putText(display_frame, 'Face', (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        return display_frame
+    
+    def capture_image(self, newer_than=-1, timeout=1.0):
+        """从帧缓冲取最新画面
+
+        返回的帧已占用一次引用，用完后需调用 frame.release()
+        """
+        frame = self.frame_buffer.latest(newer_than=newer_than, timeout=timeout)
+        if frame is None:
             return False, None
+        return True, frame
     
-    def image_to_base64(self, image):
-        """将图像转换为base64编码"""
+    def _group_size(self, detection):
+        """本次一起夸奖的人数；未开启多人模式或只有一个人时为 1"""
+        if self.batch_people and len(detection.people) > 1:
+            return len(detection.people)
+        return 1
+
+    def encode_upload(self, detection):
+        """把检测到的人裁剪、缩放并编码成上传用的 data URL
+
+        高清照片或检测帧为 YUV420 时直接在 I420 平面上裁剪编码，整帧不转 BGR；
+        多人模式下返回每个人各自裁剪的 data URL 列表（从左到右），大小上限由各张平分
+        """
         try:
-            _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            image_base64 = base64.b64encode(buffer).decode('utf-8')
-            return image_base64
+            count = self._group_size(detection)
+            if count > 1:
+                # 每个人各自裁剪（YUV 时同样直接在 I420 平面上裁剪编码）
+                image, pixel_format = detection.upload_source()
+                budget = self.upload_encoder.max_bytes // count
+                return [
+                    self.upload_encoder.data_url(image, [person.box], detection.target, pixel_format, max_bytes=budget)
+                    for person in detection.people
+                ]
+            image, pixel_format = detection.upload_source()
+            return self.upload_encoder.data_url(image, detection.scaled_faces(), detection.target, pixel_format)
         except Exception as e:
             logger.error(f"图像编码失败: {e}")
             return None
 
-    def emotion_recognition(self):
-        """使用DeepFace库（基于OpenCV和深度学习）"""
+    def emotion_recognition(self, detection):
+        """识别情绪：优先用后台推测好的多帧平均结果，没有时在检测到的人脸区域上现场推理；
+        多人模式下读取每个人的后台结果，记在各自的 Person 上
+        """
         try:
-            # 分析情绪
-            result = DeepFace.analyze(
-                img_path=self.picam2.capture_array(),
-                actions=['emotion'],
-                detector_backend='opencv',
-                enforce_detection=False,  # 如果未检测到人脸则抛出异常
-                align=True  # 对齐人脸以提高准确率
+            if self._group_size(detection) > 1:
+                return self._group_emotions(detection)
+            result = None
+            if self.speculative_emotion and detection.faces:
+                face = max(detection.faces, key=lambda f: f[2] * f[3])
+                result = self.emotion_tracker.latest(face, *detection.frame.size)
+            if result is not None:
+                return result.dominant
+            result = self.emotion.recognize(
+                detection.image,
+                detection.largest_face(),
+                is_face=detection.target == 'face'
             )
-            result1 = result[0]['dominant_emotion']
-            return result1  # 返回第一个检测到的人脸结果
+            if result is None:
+                return {"error": "情绪模型不可用"}
+            return result.dominant
         except Exception as e:
             return {"error": str(e)}
 
+    def _group_emotions(self, detection):
+        """多人模式下每个人的情绪，返回"第1位happy，第2位neutral"这样的描述
+
+        只读取后台已经算好的结果，没有的按"未知"处理，不在提示词的关键路径上逐个推理；
+        关闭推测式识别时才现场逐个识别
+        """
+        descriptions = []
+        for person in detection.people:
+            if self.speculative_emotion:
+                result = self.emotion_tracker.latest(person.face, *detection.frame.size)
+            else:
+                result = self.emotion.recognize(detection.image, person.box, is_face=detection.target == 'face')
+            person.emotion = result.dominant if result is not None else '未知'
+            descriptions.append(f"第{person.index}位{person.emotion}")
+        return '，'.join(descriptions)
+
     def get_time(self):
         """
         获取当前时间的基本函数
@@ -200,42 +295,66 @@ class FashionComplimentSystem:
 
         return current_time
 
+    def _location_request(self):
+        """定位请求的地址和请求头"""
+        headers = {
+            "sec-ch-ua": "\"Chromium\";v=\"142\", \"Microsoft Edge\";v=\"142\", \"Not_A Brand\";v=\"99\"",
+            "sec-ch-ua-mobile": "?0",
+            "sec-ch-ua-platform": "\"Windows\"",
+            "upgrade-insecure-requests": "1",
+            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36 Edg/142.0.0.0",
+            "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+            "sec-fetch-site": "none",
+            "sec-fetch-mode": "navigate",
+            "sec-fetch-user": "?1",
+            "sec-fetch-dest": "document",
+            "accept-encoding": "gzip, deflate, zstd",
+            "accept-language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
+            "priority": "u=0, i"
+        }
+        return 'https://api.ip.sb/geoip/', headers
+
+    def _parse_location(self, data):
+        """从定位接口的响应中取出位置信息"""
+        return {
+            'city': data.get('city'),
+            'region': data.get('region'),
+            'country': data.get('country'),
+            'latitude': data.get('latitude'),
+            'longitude': data.get('longitude')
+        }
+
     def get_location(self):
         try:
-            headers = {
-                "sec-ch-ua": "\"Chromium\";v=\"142\", \"Microsoft Edge\";v=\"142\", \"Not_A Brand\";v=\"99\"",
-                "sec-ch-ua-mobile": "?0",
-                "sec-ch-ua-platform": "\"Windows\"",
-                "upgrade-insecure-requests": "1",
-                "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36 Edg/142.0.0.0",
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-                "sec-fetch-site": "none",
-                "sec-fetch-mode": "navigate",
-                "sec-fetch-user": "?1",
-                "sec-fetch-dest": "document",
-                "accept-encoding": "gzip, deflate, zstd",
-                "accept-language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
-                "priority": "u=0, i"
-            }
-            response = requests.get('https://api.ip.sb/geoip/', headers=headers)
+            url, headers = self._location_request()
+            response = self.http.get(url, headers=headers, timeout=5)
             # print(response.text)
-            data = response.json()
-            location_info = {
-                'city': data.get('city'),
-                'region': data.get('region'),
-                'country': data.get('country'),
-                'latitude': data.get('latitude'),
-                'longitude': data.get('longitude')
-            }
+            location_info = self._parse_location(response.json())
             # print(location_info)
             return location_info
         except Exception as e:
             print(f"获取位置失败: {e}")
             return None
 
-    def get_current_weather(self):
+    def _weather_url(self, lat, lon):
+        """使用经纬度查询天气的地址"""
+        # 替换为你的OpenWeatherMap API密钥
+        API_KEY = "123"
+        return f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_KEY}&units=metric&lang=zh_cn"
+
+    def _parse_weather(self, weather_data):
+        """提取并格式化天气信息"""
+        return {
+            "temperature": f"{weather_data['main']['temp']:.1f}℃",
+            "feels_like": f"{weather_data['main']['feels_like']:.1f}℃",
+            "weather": weather_data['weather'][0]['description'],
+            "humidity": f"{weather_data['main']['humidity']}%",
+            "wind_speed": f"{weather_data['wind']['speed']} m/s"
+        }
+
+    def get_current_weather(self, location=None):
         """
-        获取当前位置的简单天气信息
+        获取当前位置的简单天气信息，已知位置时可直接传入，避免重复定位
 
         返回格式:
         {
@@ -252,11 +371,7 @@ class FashionComplimentSystem:
         def get_weather(lat, lon):
             """使用经纬度获取天气信息"""
             try:
-                # 替换为你的OpenWeatherMap API密钥
-                API_KEY = "123"
-                url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_KEY}&units=metric&lang=zh_cn"
-
-                response = requests.get(url, timeout=50)
+                response = self.http.get(self._weather_url(lat, lon), timeout=10)
                 # print(response.json())
                 if response.status_code == 200:
                     return response.json()
@@ -267,7 +382,8 @@ class FashionComplimentSystem:
         # 3. 主逻辑
         try:
             # 获取当前位置
-            location = self.get_location()
+            if location is None:
+                location = self.get_location()
             if not location:
                 return {"error": "无法获取当前位置信息"}
 
@@ -277,80 +393,195 @@ class FashionComplimentSystem:
                 return {"error": "无法获取天气信息"}
 
             # 提取并格式化天气信息
-            return {
-                "temperature": f"{weather_data['main']['temp']:.1f}℃",
-                "feels_like": f"{weather_data['main']['feels_like']:.1f}℃",
-                "weather": weather_data['weather'][0]['description'],
-                "humidity": f"{weather_data['main']['humidity']}%",
-                "wind_speed": f"{weather_data['wind']['speed']} m/s"
-            }
+            return self._parse_weather(weather_data)
 
         except Exception as e:
             return {"error": f"获取天气信息失败: {str(e)}"}
 
-    def build_prompt(self):
+    def _load_location(self):
+        """位置缓存的加载函数，asyncio 模式下在事件循环上请求"""
+        if self.orchestrator:
+            return self.orchestrator.run(self.orchestrator.get_location(), timeout=10)
+        return self.get_location()
+
+    def _load_weather(self):
+        """天气缓存的加载函数：复用缓存中的位置，避免重复定位"""
+        location = self.context_cache.get('location')
+        if not location:
+            return None
+        if self.orchestrator:
+            return self.orchestrator.run(self.orchestrator.get_current_weather(location), timeout=15)
+        return self.get_current_weather(location)
+
+    def build_prompt(self, detection):
+        # 并行获取天气、地点、时间、情绪
+        context = self.context_gatherer.gather(detection=detection)
+        return self.format_prompt(context, self._group_size(detection))
+
+    def format_prompt(self, context, people=1):
+        """用上下文（天气、地点、时间、情绪）填充提示词；people 大于 1 时让大模型分别夸奖每一位"""
+        if people > 1:
+            return self._format_group_prompt(context, people)
         prompt =f"""请根据这张人物照片，生成一段热情洋溢的穿衣搭配夸奖。重点描述：
     1. 服装的颜色搭配和风格
     2. 整体的时尚感和个人气质
     3. 具体的穿搭亮点
     要求语言生动有趣，充满赞美之情，长度在50-80字左右,并结合以下时间地点天气情绪信息
-    天气{self.get_current_weather()}
-    地点是{self.get_location()}
-    时间是{self.get_time()}
-    人物的心情是{self.emotion_recognition()}
+    天气{context['weather']}
+    地点是{context['location']}
+    时间是{context['time']}
+    人物的心情是{context['emotion']}
 """
         print(prompt)
         return prompt
 
-    def call_doubao_api(self, image_base64):
-        """
-            调用豆包API生成穿衣夸夸文本
-            使用豆包API的实际接口进行调用
-        """
-        try:
-            import requests
-            import json
-            import random
-            
-            # 豆包API的端点（请根据实际API文档调整）
-            api_url = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"  # 示例URL，需替换为真实端点
-            
-            # API密钥（建议从环境变量或配置文件中获取）
-            api_key = "123"  # 需要替换为实际的API密钥
+    def _format_group_prompt(self, context, people):
+        """多人提示词：每位一段，以【N】开头，便于逐位播报"""
+        prompt = f"""镜子前有{people}位人物，下面按从左到右的顺序依次附上每一位的照片（第1张是最左边的一位）。
+    请分别为每一位生成一段热情洋溢的穿衣搭配夸奖，重点描述服装的颜色搭配和风格、整体的时尚感和具体的穿搭亮点。
+    要求：
+    1. 每位一段，按从左到右的顺序输出，每段以【1】、【2】这样的编号开头，编号后先用"左边这位""中间这位"之类的称呼点名
+    2. 每段30-50字，语言生动有趣，各段的夸奖角度不要重复
+    3. 结合以下时间地点天气情绪信息
+    天气{context['weather']}
+    地点是{context['location']}
+    时间是{context['time']}
+    每位人物的心情是{context['emotion']}
+"""
+        print(prompt)
+        return prompt
 
-            
-            # 构建请求头
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            }
-            
-            # 构建请求数据
-            payload = {
-                "model": "doubao-seed-1-6-251015",  # 根据实际模型名称调整
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": self.build_prompt()
-                            },
+    def _doubao_request(self, image_url, detection, stream=False, prompt=None):
+        """构建豆包API的请求头和请求数据，prompt 为 None 时现场生成提示词
+
+        image_url 为列表时（多人模式）每张图依次附在提示词后面，同一次请求返回所有人的夸奖
+        """
+        image_urls = image_url if isinstance(image_url, list) else [image_url]
+        # 构建请求头
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.doubao_api_key}"
+        }
+        
+        # 构建请求数据
+        payload = {
+            "model": self.doubao_model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt if prompt is not None else self.build_prompt(detection)
+                        },
+                        *(
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
+                                    "url": url
                                 }
                             }
-                        ]
-                    }
-                ],
-                "max_tokens": 300,
-                "temperature": 0.7
-            }
+                            for url in image_urls
+                        )
+                    ]
+                }
+            ],
+            "max_tokens": 300 * len(image_urls),
+            "temperature": 0.7
+        }
+        if stream:
+            payload["stream"] = True
+        return headers, payload
+    
+    def _backup_compliment(self):
+        """网络异常时使用备用夸赞语句，资源包可用时带预合成的语音"""
+        import random
+        
+        if self.backup_pack.matches(self.tts_format, self.tts_sample_rate):
+            compliment = self.backup_pack.choose()
+        else:
+            compliment = random.choice(BACKUP_COMPLIMENTS)
+        logger.info(f"使用备用夸夸文本: {compliment}")
+        return compliment
+
+    def _context_signature(self):
+        """夸奖缓存的场景标识：天气 + 时段，场景不同时不复用旧的夸奖
+
+        在编码阶段的关键路径上，只读内存中的天气，不等网络加载（没有天气时按未知）
+        """
+        weather = self.context_cache.peek('weather')
+        description = weather.get('weather', '未知') if isinstance(weather, dict) else '未知'
+        hour = datetime.now().hour
+        if hour < 11:
+            period = '上午'
+        elif hour < 14:
+            period = '中午'
+        elif hour < 18:
+            period = '下午'
+        else:
+            period = '晚上'
+        return f"{description}|{period}"
+
+    def _serve_cached_compliment(self, state, detection):
+        """相似穿搭有缓存的夸奖时直接送去播放，返回是否命中；未命中时记下穿搭特征，生成后保存
+
+        缓存按一身穿搭索引，多人夸奖不查也不存
+        """
+        if not self.use_compliment_cache or self._group_size(detection) > 1:
+            return False
+        # YUV 照片直接在平面上裁剪衣着区域，不把整张照片转成 BGR
+        image, pixel_format = detection.upload_source()
+        embedding = outfit_embedding(image, detection.largest_face(), detection.target, pixel_format)
+        signature = self._context_signature()
+        entry_id, cached = self.compliment_cache.lookup(
+            embedding, signature, self.tts_format, self.tts_sample_rate)
+        state['cache_key'] = (embedding, signature, entry_id)
+        if cached is None:
+            return False
+        state['cached'] = True
+        self.audio_player.add_audio_chunk(cached['audio'])
+        return True
+
+    def _split_people(self, state, text):
+        """多人夸奖：按【N】标记把句子归到对应的人并去掉标记，返回要播报的文本
+
+        没有标记的句子原样返回（备用夸奖带着预合成语音，不能换成新字符串）
+        """
+        segments = split_person_tags(text, state.get('person'))
+        if not segments:
+            return text
+        for person, part in segments:
+            if person is not None:
+                state.setdefault('people', {}).setdefault(person, []).append(part)
+        state['person'] = segments[-1][0]
+        if len(segments) == 1 and segments[0][1] == text:
+            return text
+        return ''.join(part for _, part in segments)
+
+    def _store_compliment(self, state):
+        """保存本次生成的夸奖文本和音频；备用夸奖不保存，多人夸奖只记录每位的夸奖"""
+        for person, parts in sorted(state.get('people', {}).items()):
+            logger.info(f"第{person}位的夸奖: {''.join(parts)}")
+        texts = state.get('texts')
+        audio = state.get('audio')
+        if 'cache_key' not in state or state.get('cached') or not texts or not audio:
+            return
+        if any(isinstance(text, BackupCompliment) or text in BACKUP_COMPLIMENTS for text in texts):
+            return
+        embedding, signature, entry_id = state['cache_key']
+        self.compliment_cache.store(embedding, signature, ''.join(texts), bytes(audio),
+                                    self.tts_format, self.tts_sample_rate, entry_id=entry_id)
+    
+    def call_doubao_api(self, image_url, detection, prompt=None):
+        """
+            调用豆包API生成穿衣夸夸文本
+            使用豆包API的实际接口进行调用
+        """
+        try:
+            headers, payload = self._doubao_request(image_url, detection, prompt=prompt)
             
             # 发送API请求
-            response = requests.post(api_url, headers=headers, json=payload, timeout=30)
+            response = self.http.post(self.doubao_api_url, headers=headers, json=payload, timeout=30)
             response.raise_for_status()  # 如果请求失败会抛出异常
             
             # 解析响应
@@ -362,91 +593,65 @@ class FashionComplimentSystem:
             
         except requests.exceptions.RequestException as e:
             logger.error(f"调用豆包API网络请求失败: {e}")
-            # 网络异常时使用备用夸赞语句
-            backup_compliments = [
-                "哇!你这身搭配真是太有品味了!颜色的搭配非常和谐，整体造型既时尚又显气质，完美展现了你的个人风格!",
-                "今天的穿搭真是让人眼前一亮!服装的剪裁和配色都恰到好处，既显瘦又显高，简直是时尚达人的典范!",
-                "这套衣服真的太适合你了!简约而不简单，细节处见真章，完美衬托出你的优雅气质和时尚感!",
-                "你的穿衣风格总是这么出众!这次的搭配色彩明快，款式新颖，既显年轻活力又不失稳重，真是太棒了!"
-            ]
-            compliment = random.choice(backup_compliments)
-            logger.info(f"使用备用夸夸文本: {compliment}")
-            return True, compliment
+            return True, self._backup_compliment()
+    
+    def call_doubao_api_stream(self, image_url, detection, prompt=None):
+        """
+            流式调用豆包API，逐句产出夸夸文本
+            还没产出任何句子就失败时改用备用夸赞语句
+        """
+        response = None
+        sentences = 0
+        try:
+            headers, payload = self._doubao_request(image_url, detection, stream=True, prompt=prompt)
+            start_time = time.monotonic()
+            response = self.http.post(self.doubao_api_url, headers=headers, json=payload,
+                                      stream=True, timeout=30)
+            response.raise_for_status()
+            
+            for sentence in iter_sentences(response):
+                if sentences == 0:
+                    logger.info(f"豆包API首句耗时 {time.monotonic() - start_time:.2f}s")
+                sentences += 1
+                logger.info(f"豆包API生成的夸夸文本: {sentence}")
+                yield sentence
+                
+        except requests.exceptions.RequestException as e:
+            logger.error(f"调用豆包API网络请求失败: {e}")
+            if sentences == 0:
+                yield self._backup_compliment()
+        finally:
+            # 正常结束时响应体已读完，close 把连接放回连接池；中途取消时直接关闭连接
+            if response is not None:
+                response.close()
             
     def call_volcano_tts(self, text):
         """调用火山引擎TTS流式API并实时播放音频"""
-        url = "https://openspeech.bytedance.com/api/v3/tts/unidirectional"
-        headers = {
-            "X-Api-App-Id": "123",
-            "X-Api-Access-Key": "123",
-            "X-Api-Resource-Id": "seed-tts-2.0",
-            "Content-Type": "application/json",
-            "Connection": "keep-alive"
-        }
-        payload = {
-            "req_params":{
-                "text": text,
-                "speaker": "zh_female_meilinvyou_saturn_bigtts",
-                "audio_params": {
-                    "format": "mp3",
-                    "sample_rate": 4000,
-                    "enable_timestamp": True
-                },
-                "additions": "{\"explicit_language\":\"zh\",\"disable_markdown_filter\":true, \"enable_timestamp\":true}\"}"
-            }
-        }
-
-        session = requests.Session()
         try:
-            print('开始TTS流式请求...')
-            response = session.post(url, headers=headers, json=payload, stream=True, timeout=30)
-            print(f"响应状态码: {response.status_code}")
-            
-            logid = response.headers.get('X-Tt-Logid')
-            print(f"X-Tt-Logid: {logid}")
-
-            # 实时处理音频流
-            for chunk in response.iter_lines(decode_unicode=True):
-                if not chunk:
-                    continue
-                    
-                try:
-                    data = json.loads(chunk)
-                    
-                    # 处理音频数据
-                    if data.get("code", 0) == 0 and "data" in data and data["data"]:
-                        chunk_audio = base64.b64decode(data["data"])
-                        print(f"收到音频数据块，大小: {len(chunk_audio)} 字节")
-                        self.audio_player.add_audio_chunk(chunk_audio)
-                        
-                    # 处理文本信息
-                    elif data.get("code", 0) == 0 and "sentence" in data and data["sentence"]:
-                        print(f"文本信息: {data['sentence']}")
-                        
-                    # 流结束
-                    elif data.get("code", 0) == 20000000:
-                        print("TTS流结束")
-                        break
-                        
-                    # 错误处理
-                    elif data.get("code", 0) > 0:
-                        print(f"TTS错误响应: {data}")
-                        break
-                        
-                except json.JSONDecodeError as e:
-                    print(f"JSON解析错误: {e}")
-                except Exception as e:
-                    print(f"处理数据块时出错: {e}")
-
-        except Exception as e:
-            print(f"TTS请求失败: {e}")
+            for chunk_audio in self.iter_volcano_tts(text):
+                self.audio_player.add_audio_chunk(chunk_audio)
         finally:
-            response.close()
-            session.close()		
+            # 本段语音的数据已全部送入播放器
+            self.audio_player.finish()
     
-    def process_detection(self):
-        """处理检测到的人像"""
+    def iter_volcano_tts(self, text):
+        """调用火山引擎TTS流式API，逐块产出音频数据；备用夸奖自带语音时不调用接口"""
+        audio = getattr(text, 'audio', None)
+        if audio is not None:
+            return iter((audio,))
+        return self.tts.iter_audio(text)
+    
+    def process_detection(self, frame, faces):
+        """处理检测到的人像
+
+        frame 为检测循环正在使用的共享帧，faces 为检测循环刚得到的检测框，
+        直接沿用，不重新取帧也不重新检测
+        """
         with self.detection_lock:
+            # 上一次夸奖还没结束（如还在等播报完），不提交新任务，
+            # 否则上一个任务结束时会把 is_processing 清掉，而新任务还在进行
+            if self.is_processing:
+                return
             current_time = time.time()
             if current_time - self.last_detection_time < self.detection_cooldown:
                 return
@@ -454,70 +659,164 @@ class FashionComplimentSystem:
             # 更新检测时间
             self.last_detection_time = current_time
             
-            # 捕获图像
-            success, frame = self.capture_image()
-            if not success:
-                return
-            
-            # 检测人像
-            human_detected, detected_frame = self.detect_human(frame.copy())
+            logger.info(f"检测到人像({len(faces)}个)，开始处理...")
             
-            if human_detected:
-                logger.info("检测到人像，开始处理...")
-                
-                # 在新线程中处理后续流程
-                process_thread = Thread(target=self._process_compliment, args=(frame,))
-                process_thread.daemon = True
-                process_thread.start()
+            # 交给夸夸流水线（或 asyncio 事件循环）处理，任务结束时释放帧
+            detection = Detection(frame.retain(), faces, self.detector.target, max_people=self.max_people)
+            self.is_processing = True
+            self._cancel_requested = False
+            if self.orchestrator:
+                submitted = self.orchestrator.submit(detection)
+            else:
+                submitted = self.pipeline.submit(detection) is not None
+            if not submitted:
+                detection.release()
+                self.is_processing = False
     
-    def _process_compliment(self, image):
-        """处理夸夸流程"""
-        # 图像编码
-        image_base64 = self.image_to_base64(image)
-        if image_base64 is None:
-            return
-            
-        # 调用豆包API生成文本
-        success, compliment_text = self.call_doubao_api(image_base64)
-        if not success:
+    def _stage_encode(self, job, detection):
+        """编码阶段：触发时才拍高清照片；帧源不支持时上传检测帧（只有这一帧转换为BGR）"""
+        detection.set_still(self.frame_source.capture_still(), self.frame_source.still_format)
+        if self._serve_cached_compliment(job.data, detection):
+            # 命中夸奖缓存，后面的阶段都不用走
+            return None
+        return self.encode_upload(detection)
+    
+    def _stage_context(self, job, image_url):
+        """上下文阶段：并行获取天气、地点、时间、情绪，生成提示词"""
+        return image_url, self.build_prompt(job.payload)
+    
+    def _stage_llm(self, job, request):
+        """大模型阶段：流式生成时每凑齐一句就产出，否则产出完整文本"""
+        image_url, prompt = request
+        if self.stream_llm:
+            yield from self.call_doubao_api_stream(image_url, job.payload, prompt=prompt)
             return
-            
-        # 调用TTS转换为语音
+        success, compliment_text = self.call_doubao_api(image_url, job.payload, prompt=prompt)
+        if success:
+            yield compliment_text
+    
+    def _stage_tts(self, job, text):
+        """TTS阶段：逐句合成，逐块产出音频数据；多人夸奖按顺序一位接一位播报"""
         self.is_playing = True
-        tts_success = self.call_volcano_tts(compliment_text)
-        self.is_playing = False
+        text = self._split_people(job.data, text)
+        job.data.setdefault('texts', []).append(text)
+        yield from self.iter_volcano_tts(text)
+    
+    def _stage_playback(self, job, chunk):
+        """播放阶段：音频数据写入播放器，播放跟不上时阻塞，TTS随之放慢"""
+        self.audio_player.add_audio_chunk(chunk)
+        if self.use_compliment_cache:
+            job.data.setdefault('audio', bytearray()).extend(chunk)
+    
+    def _on_compliment_done(self, job):
+        """夸夸任务结束：取消时立即停止播放，否则等播报完才算处理结束，期间检测保持低频"""
+        try:
+            if job.cancelled:
+                self.audio_player.interrupt()
+            else:
+                self.audio_player.finish()
+                self.audio_player.flush(timeout=60)
+                if job.error is None:
+                    self._store_compliment(job.data)
+        finally:
+            job.payload.release()
+            self.is_playing = False
+            self.is_processing = False
+    
+    def _check_presence(self, human_detected):
+        """夸奖进行中人已离开超过 leave_timeout 秒时取消，正在播的语音随之停止"""
+        now = time.time()
+        if human_detected or self.face_detector.tracks:
+            self.last_seen = now
+            return
+        if self.is_processing and not self._cancel_requested and now - self.last_seen > self.leave_timeout:
+            logger.info("人已离开，取消夸奖")
+            self._cancel_requested = True
+            if self.orchestrator:
+                self.orchestrator.cancel()
+            else:
+                self.pipeline.cancel_all()
+                # 取消只是给任务打标记，各阶段走到下一个产出点才停；缓冲的语音这里直接停掉
+                self.audio_player.interrupt()
+    
+    def _prewarm_connections(self):
+        """预热大模型和TTS的连接：asyncio 模式下预热真正发请求的 aiohttp 会话"""
+        if self.orchestrator:
+            self.orchestrator.prewarm(self.http.prewarm_urls)
+        else:
+            self.http.prewarm()
+    
+    def _update_schedule(self, human_detected):
+        """根据当前状态设定检测频率"""
+        if self.is_processing:
+            state = BUSY
+        elif time.time() - self.last_detection_time < self.detection_cooldown:
+            state = COOLDOWN
+        elif human_detected or self.face_detector.tracks:
+            state = PRESENT
+            # 有人靠近时先把连接建好，触发时省去握手
+            self._prewarm_connections()
+        else:
+            state = IDLE
+        self.scheduler.set_state(state)
         
 
     def start_detection(self):
         """开始人像检测"""
         try:
-            self.picam2.start()
+            self.frame_source.start()
+            self.frame_grabber.start()
             self.is_detecting = True
             
             logger.info("开始人像检测...")
             print("系统已启动，正在检测人像...")
             # print("按 'q' 键退出程序")
             
+            last_seq = -1
             while self.is_detecting:
-                # 捕获帧进行检测
-                success, frame = self.capture_image()
-                if success:
-                    # 检测人像
-                    human_detected, display_frame = self.detect_human(frame)
+                # 取比上次更新的最新帧，中间积压的帧直接丢弃
+                success, frame = self.capture_image(newer_than=last_seq)
+                if not success:
+                    if not self.frame_grabber.is_running:
+                        # 帧源已结束（回放完毕）
+                        break
+                    continue
+                last_seq = frame.seq
+                self.scheduler.begin_frame()
+                
+                try:
+                    # 正在跟踪人脸时保持门打开，人站着不动也继续检测
+                    if self.face_detector.tracks:
+                        self.motion_gate.open()
+                    
+                    # 画面静止时跳过检测
+                    if self.motion_gate.check(frame.gray):
+                        human_detected, faces = self.detect_human(self._detector_input(frame))
+                    else:
+                        human_detected, faces = False, []
                     
                     # 显示检测画面（可选）
-                    cv2.imshow('Human Detection', display_frame)
+                    if self.show_preview:
+                        cv2.imshow('Human Detection', self._draw_detections(frame.gray, faces))
                     
                     if human_detected:
-                        self.process_detection()
+                        if self.speculative_emotion and self.detector.target == 'face':
+                            # 提前在后台算情绪（多人模式下每个人都算），不等触发
+                            people = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)
+                            self.emotion_tracker.offer(frame, people[:self.max_people if self.batch_people else 1])
+                        self.process_detection(frame, faces)
                     
                     # 检测按键输入
                     # key = cv2.waitKey(1) & 0xFF
                     # if key == ord('q'):
                     #     break
+                finally:
+                    frame.release()
                 
-                # 控制检测频率
-                time.sleep(0.1)
+                # 按状态决定下一帧之前休眠多久
+                self._check_presence(human_detected)
+                self._update_schedule(human_detected)
+                self.scheduler.end_frame()
                 
         except KeyboardInterrupt:
             logger.info("程序被用户中断")
@@ -529,20 +828,177 @@ class FashionComplimentSystem:
     def stop(self):
         """停止检测并清理资源"""
         self.is_detecting = False
-        if self.picam2:
-            self.picam2.stop()
+        if self.frame_grabber:
+            self.frame_grabber.stop()
+            logger.info(
+                f"采集统计: {self.frame_grabber.frames_captured} 帧, "
+                f"{self.frame_grabber.fps:.1f} fps, "
+                f"跳过 {self.frame_buffer.frames_skipped} 帧, "
+                f"丢弃 {self.frame_buffer.frames_dropped} 帧"
+            )
+        if self.face_detector:
+            stats = self.face_detector.stats()
+            logger.info(
+                f"检测统计: {stats['frames']} 帧, {stats['fps']:.1f} fps, "
+                f"单帧 {stats['avg_ms']:.1f} ms, CPU {stats['cpu_percent']:.0f}%, "
+                f"全画面 {stats['full_scans']} 次, 局部 {stats['roi_scans']} 次, "
+                f"模板匹配 {stats['template_hits']} 次"
+            )
+        logger.info(
+            f"调度统计: 各状态帧数 {self.scheduler.frames}, "
+            f"超预算 {self.scheduler.overruns}, 占空比 {self.scheduler.duty_cycle:.0%}"
+        )
+        if self.motion_gate.frames:
+            logger.info(
+                f"运动门控: {self.motion_gate.frames} 帧, "
+                f"跳过检测 {self.motion_gate.skip_ratio:.0%}"
+            )
+        audio = self.audio_player.stats()
+        logger.info(
+            f"音频统计: {audio['chunks']} 块数据, 播放 {audio['blocks_played']} 块, "
+            f"断流 {audio['underruns']} 次, 打断 {audio['interrupts']} 次, "
+            f"最大队列 {audio['max_queue_depth']}, TTS阻塞 {audio['put_wait']:.2f}s"
+            f"(最长 {audio['max_put_wait']:.2f}s)"
+        )
+        pipeline = self.pipeline.stats()
+        for name, stage in pipeline['stages'].items():
+            logger.info(
+                f"流水线 {name}: {stage['items']} 项, 出错 {stage['errors']}, 丢弃 {stage['dropped']}, "
+                f"排队 p50/p95 {stage['wait']['p50_ms']:.0f}/{stage['wait']['p95_ms']:.0f} ms, "
+                f"处理 p50/p95 {stage['service']['p50_ms']:.0f}/{stage['service']['p95_ms']:.0f} ms"
+            )
+        logger.info(
+            f"流水线: 提交 {pipeline['submitted']}, 拒绝 {pipeline['rejected']}, 取消 {pipeline['cancelled']}, "
+            f"首次出声 p50/p95 {pipeline['first_output']['p50_ms']:.0f}/{pipeline['first_output']['p95_ms']:.0f} ms, "
+            f"全程 p50/p95 {pipeline['total']['p50_ms']:.0f}/{pipeline['total']['p95_ms']:.0f} ms"
+        )
+        upload = self.upload_encoder.stats()
+        if upload['requests']:
+            logger.info(
+                f"上传编码: {upload['requests']} 张, 平均 {upload['avg_kb']:.0f} KB, "
+                f"编码 {upload['avg_ms']:.0f} ms({upload['avg_encodes']:.1f} 次), "
+                f"超出大小上限 {upload['over_budget']} 张"
+            )
+        self.pipeline.stop()
+        if self.orchestrator:
+            self.orchestrator.stop()
+        self.audio_player.stop()
+        cache = self.compliment_cache
+        logger.info(
+            f"夸奖缓存: {len(cache.entries)} 身穿搭, 命中 {cache.hits}, 未命中 {cache.misses}, "
+            f"新增 {cache.stores}, 淘汰 {cache.evictions}"
+        )
+        self.backup_pack.close()
+        self.emotion_tracker.stop()
+        emotion = self.emotion.stats()
+        tracker = self.emotion_tracker.stats()
+        logger.info(
+            f"情绪识别: 推理 {emotion['inferences']} 次, 平均 {emotion['avg_ms']:.0f} ms, "
+            f"缓存命中 {emotion['cache_hits']} 次, 模型加载 {emotion['load_s']:.1f}s, "
+            f"后台推理 {tracker['offered']} 帧(丢弃 {tracker['dropped']}), "
+            f"提示词直接读取 {tracker['hits']} 次, 现场推理 {tracker['misses']} 次"
+        )
+        self.context_cache.stop()
+        for host, stats in self.http.stats.summary().items():
+            logger.info(
+                f"HTTP {host}: {stats['requests']} 次请求, "
+                f"新建连接 {stats['connects']} 次, 建连耗时 {stats['connect_ms']:.0f} ms"
+            )
+        self.http.close()
+        self.context_gatherer.shutdown()
+        if self.frame_source:
+            self.frame_source.stop()
         cv2.destroyAllWindows()
         logger.info("系统已停止")
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="树莓派穿衣夸夸系统")
+    parser.add_argument('--source', default='picamera',
+                        help="帧源: picamera / video:<设备号|URL> / replay:<目录|视频文件>")
+    parser.add_argument('--fps', type=float, default=None,
+                        help="回放帧率，不指定则全速回放")
+    parser.add_argument('--no-preview', action='store_true', help="不显示检测画面")
+    parser.add_argument('--no-tracking', action='store_true', help="关闭人脸跟踪，每帧全画面检测")
+    parser.add_argument('--detector', default='haar', help="检测后端: haar / yunet / dnn / hog")
+    parser.add_argument('--no-motion-gate', action='store_true', help="关闭运动门控，每帧都做检测")
+    parser.add_argument('--motion-threshold', type=float, default=0.01,
+                        help="判定为运动的变化像素占比")
+    parser.add_argument('--still-size', default='1640x1232',
+                        help="触发时拍摄的高清照片分辨率，如 1640x1232；none 表示上传检测帧")
+    parser.add_argument('--jpeg-quality', type=int, default=90, help="上传照片的最高编码质量")
+    parser.add_argument('--upload-format', choices=('jpeg', 'webp'), default='jpeg', help="上传照片的编码格式")
+    parser.add_argument('--upload-long-edge', type=int, default=1024, help="上传照片缩放后的最大长边(像素)")
+    parser.add_argument('--upload-max-kb', type=int, default=200,
+                        help="上传照片的大小上限(KB)，超出时自动降低质量")
+    parser.add_argument('--encoder-backend', choices=('auto', 'turbojpeg', 'opencv'), default='auto',
+                        help="上传照片的编码后端: auto 优先 turbojpeg（需要 PyTurboJPEG）")
+    parser.add_argument('--no-upload-crop', action='store_true', help="上传整张照片，不裁剪到人物")
+    parser.add_argument('--doubao-url', default=None,
+                        help="豆包接口地址，可指向 mock_doubao_server.py 做本地测试")
+    parser.add_argument('--no-stream-llm', action='store_true', help="等大模型生成完整文本后再合成语音")
+    parser.add_argument('--tts-format', choices=('pcm', 'mp3'), default='pcm',
+                        help="TTS音频格式: pcm 直接播放, mp3 需要 ffmpeg 解码")
+    parser.add_argument('--no-compliment-cache', action='store_true', help="每次都重新生成夸奖，不用缓存")
+    parser.add_argument('--cache-threshold', type=float, default=0.9,
+                        help="穿搭颜色相似度达到该值(0-1)时复用缓存的夸奖")
+    parser.add_argument('--runtime', choices=('threads', 'asyncio'), default='threads',
+                        help="夸夸流程运行方式: threads 分阶段线程流水线, asyncio 单事件循环(需要 aiohttp)")
+    parser.add_argument('--leave-timeout', type=float, default=10.0,
+                        help="夸奖进行中人离开超过该秒数则取消")
+    parser.add_argument('--no-speculative-emotion', action='store_true',
+                        help="不在后台提前识别情绪，触发夸奖时再识别")
+    parser.add_argument('--no-batch-people', action='store_true',
+                        help="多人同时出现时不分别夸奖，按一张整体照片夸奖")
+    parser.add_argument('--max-people', type=int, default=3, help="多人模式下一次最多夸奖的人数")
+    args = parser.parse_args()
+    if not 1 <= args.jpeg_quality <= 100:
+        parser.error("--jpeg-quality 需要在 1-100 之间")
+    
+    if args.still_size.lower() == 'none':
+        still_size = None
+    else:
+        width, height = args.still_size.lower().split('x')
+        still_size = (int(width), int(height))
+    
     print("=" * 50)
     print("树莓派穿衣夸夸系统")
     print("=" * 50)
     
     try:
-        # 创建系统实例
-        system = FashionComplimentSystem()
+        # 创建系统实例（回放时不丢帧，保证结果可复现）
+        frame_source = None
+        if args.source != 'picamera':
+            frame_source = create_frame_source(args.source, fps=args.fps)
+        system = FashionComplimentSystem(
+            frame_source=frame_source,
+            drop_stale=not args.source.startswith('replay:'),
+            still_size=still_size,
+            jpeg_quality=args.jpeg_quality,
+            detector=args.detector,
+            tts_format=args.tts_format,
+            runtime=args.runtime,
+            encoder_backend=args.encoder_backend
+        )
+        system.show_preview = not args.no_preview
+        system.stream_llm = not args.no_stream_llm
+        system.leave_timeout = args.leave_timeout
+        system.use_compliment_cache = not args.no_compliment_cache
+        system.speculative_emotion = not args.no_speculative_emotion
+        system.batch_people = not args.no_batch_people
+        system.max_people = args.max_people
+        system.upload_encoder.image_format = args.upload_format
+        system.upload_encoder.long_edge = args.upload_long_edge
+        system.upload_encoder.max_bytes = args.upload_max_kb * 1024
+        system.upload_encoder.crop = not args.no_upload_crop
+        system.compliment_cache.threshold = args.cache_threshold
+        if args.doubao_url:
+            system.doubao_api_url = args.doubao_url
+        system.face_detector.enabled = not args.no_tracking
+        system.motion_gate.enabled = not args.no_motion_gate
+        system.motion_gate.min_area = args.motion_threshold
+        # 不指定 --fps 回放录像时全速跑，不按检测帧率休眠（离线测吞吐）
+        system.scheduler.enabled = not (args.source.startswith('replay:') and args.fps is None)
         
         # 启动检测
         system.start_detection()
@@ -0,0 +1,273 @@
+"""
+帧采集子系统
+单个后台线程从摄像头取帧，写入预分配的环形缓冲区；
+检测、情绪识别和上传共享同一帧（槽位视图），不做拷贝
+"""
+
+import logging
+import threading
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Frame:
+    """环形缓冲区中的一帧
+
+    image 是缓冲区槽位的视图，持有期间该槽位不会被生产者覆盖；
+    用完后必须调用 release()（或使用 with 语句）。
+    pixel_format 为 'YUV420'（I420 平面格式）或 'BGR'
+    """
+
+    __slots__ = ('seq', 'timestamp', 'image', 'pixel_format', '_bgr', '_buffer', '_slot')
+
+    def __init__(self, buffer, slot, seq, timestamp, image, pixel_format='BGR'):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.image = image
+        self.pixel_format = pixel_format
+        self._bgr = None
+        self._buffer = buffer
+        self._slot = slot
+
+    @property
+    def size(self):
+        """画面尺寸(宽, 高)"""
+        if self.pixel_format == 'YUV420':
+            return self.image.shape[1], self.image.shape[0] * 2 // 3
+        return self.image.shape[1], self.image.shape[0]
+
+    @property
+    def gray(self):
+        """灰度图；YUV420 时直接返回 Y 平面视图，不做转换和拷贝"""
+        if self.pixel_format == 'YUV420':
+            return self.image[:self.size[1]]
+        return cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+
+    def bgr(self):
+        """BGR 图像，只在真正需要时转换一次（例如上传的那一帧）"""
+        if self.pixel_format == 'BGR':
+            return self.image
+        if self._bgr is None:
+            self._bgr = cv2.cvtColor(self.image, cv2.COLOR_YUV2BGR_I420)
+        return self._bgr
+
+    @property
+    def age(self):
+        """帧的年龄(秒)"""
+        return time.monotonic() - self.timestamp
+
+    def retain(self):
+        """增加一次引用，把帧交给其他线程前调用"""
+        self._buffer._retain(self._slot)
+        return self
+
+    def release(self):
+        """释放一次引用"""
+        self._buffer._release(self._slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class FrameRingBuffer:
+    """固定大小、预分配的最新帧环形缓冲区
+
+    生产者总是写入最旧的空闲槽位；读者只取最新帧，
+    中间来不及处理的帧直接跳过（丢弃过期帧），延迟不会累积。
+    drop_stale=False 时生产者等读者取走上一帧再写，每帧都会被处理，
+    用于回放录像时得到可复现的结果
+    """
+
+    def __init__(self, capacity=4, max_age=0.5, drop_stale=True):
+        if capacity < 2:
+            raise ValueError("环形缓冲区至少需要2个槽位")
+        self.capacity = capacity
+        self.max_age = max_age  # 超过该时长(秒)的帧视为过期，不再交给读者
+        self.drop_stale = drop_stale
+        self._slots = None
+        self.pixel_format = 'BGR'
+        self._seqs = [-1] * capacity
+        self._timestamps = [0.0] * capacity
+        self._pins = [0] * capacity
+        self._latest = -1
+        self._next_seq = 0
+        self._read_seq = -1
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # 统计信息
+        self.frames_written = 0
+        self.frames_dropped = 0  # 所有槽位都被占用时生产者丢弃的帧
+        self.frames_skipped = 0  # 读者跳过的过期帧
+
+    def allocate(self, shape, dtype=np.uint8, pixel_format='BGR'):
+        """按帧尺寸一次性分配全部槽位"""
+        with self._cond:
+            self.pixel_format = pixel_format
+            self._slots = np.empty((self.capacity,) + tuple(shape), dtype=dtype)
+            self._seqs = [-1] * self.capacity
+            self._pins = [0] * self.capacity
+            self._latest = -1
+            self._read_seq = -1
+            self._closed = False
+
+    @property
+    def is_allocated(self):
+        return self._slots is not None
+
+    def begin_write(self):
+        """为生产者挑选一个可写槽位
+
+        返回 (槽位号, 槽位数组)；所有槽位都被读者占用或缓冲区已关闭时返回 (None, None)
+        """
+        with self._cond:
+            if not self.drop_stale:
+                # 不丢帧模式：等读者取走最新帧
+                while (not self._closed and self._latest >= 0
+                       and self._seqs[self._latest] > self._read_seq):
+                    self._cond.wait()
+            if self._closed:
+                return None, None
+            slot = None
+            for i in range(self.capacity):
+                if i == self._latest or self._pins[i]:
+                    continue
+                if slot is None or self._seqs[i] < self._seqs[slot]:
+                    slot = i
+            if slot is None:
+                self.frames_dropped += 1
+                return None, None
+            # 写入期间对读者不可见
+            self._seqs[slot] = -1
+            return slot, self._slots[slot]
+
+    def commit(self, slot, ok=True, timestamp=None):
+        """发布写好的槽位，返回帧序号；写入失败时返回 -1"""
+        with self._cond:
+            if not ok:
+                return -1
+            seq = self._next_seq
+            self._next_seq += 1
+            self._seqs[slot] = seq
+            self._timestamps[slot] = time.monotonic() if timestamp is None else timestamp
+            self._latest = slot
+            self.frames_written += 1
+            self._cond.notify_all()
+            return seq
+
+    def latest(self, newer_than=-1, timeout=None):
+        """取最新一帧（已占用一次引用），没有比 newer_than 更新的帧时等待
+
+        超时或缓冲区关闭时返回 None
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                slot = self._latest
+                if slot >= 0 and self._seqs[slot] > newer_than:
+                    age = time.monotonic() - self._timestamps[slot]
+                    if not self.drop_stale or self.max_age is None or age <= self.max_age:
+                        break
+                if self._closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+            seq = self._seqs[slot]
+            if newer_than >= 0:
+                self.frames_skipped += seq - newer_than - 1
+            self._pins[slot] += 1
+            self._read_seq = max(self._read_seq, seq)
+            self._cond.notify_all()
+            return Frame(self, slot, seq, self._timestamps[slot], self._slots[slot],
+                         self.pixel_format)
+
+    def close(self):
+        """关闭缓冲区，唤醒所有等待的读者"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _retain(self, slot):
+        with self._cond:
+            self._pins[slot] += 1
+
+    def _release(self, slot):
+        with self._cond:
+            if self._pins[slot] > 0:
+                self._pins[slot] -= 1
+
+
+class FrameGrabber:
+    """后台取帧线程：环形缓冲区唯一的生产者"""
+
+    def __init__(self, source, buffer):
+        self.source = source  # FrameSource，read_into(out) 把一帧写入槽位
+        self.buffer = buffer
+        self.is_running = False
+        self.thread = None
+
+        # 统计信息
+        self.frames_captured = 0
+        self.capture_errors = 0
+        self._start_time = 0.0
+
+    def start(self):
+        """启动取帧线程"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.is_running = True
+        self._start_time = time.monotonic()
+        self.thread = threading.Thread(target=self._capture_worker)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _capture_worker(self):
+        """取帧工作线程"""
+        while self.is_running:
+            slot, out = self.buffer.begin_write()
+            if slot is None:
+                if not self.is_running:
+                    break
+                # 所有槽位都被占用，稍等再取
+                time.sleep(0.005)
+                continue
+
+            ok = False
+            try:
+                ok = bool(self.source.read_into(out))
+            except Exception as e:
+                self.capture_errors += 1
+                logger.error(f"取帧失败: {e}")
+                time.sleep(0.1)
+            finally:
+                self.buffer.commit(slot, ok)
+
+            if ok:
+                self.frames_captured += 1
+            elif self.source.finished:
+                logger.info("帧源已结束")
+                self.is_running = False
+                self.buffer.close()
+
+    @property
+    def fps(self):
+        """启动以来的平均取帧速率"""
+        elapsed = time.monotonic() - self._start_time
+        return self.frames_captured / elapsed if elapsed > 0 else 0.0
+
+    def stop(self):
+        """停止取帧线程"""
+        self.is_running = False
+        self.buffer.close()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=1)
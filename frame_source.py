@@ -0,0 +1,299 @@
+"""
+帧源抽象
+FrameGrabber 通过统一接口取帧，可以是树莓派摄像头、USB摄像头，
+也可以是录好的视频/图片目录（用于在没有摄像头的机器上做离线基准测试）
+"""
+
+import logging
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FrameSource:
+    """帧源接口
+
+    open() 之后 shape/dtype/pixel_format 可用；read_into(out) 把一帧直接写入预分配的 out，
+    成功返回 True；回放结束时 finished 置为 True
+    """
+
+    shape = None  # (高, 宽, 通道)；YUV420 时为 (高*3/2, 宽)
+    dtype = np.uint8
+    pixel_format = 'BGR'
+    still_format = 'BGR'  # capture_still() 返回的格式：BGR 或 YUV420（连续的 I420 数组）
+    finished = False
+
+    def open(self):
+        """打开设备并确定帧尺寸"""
+        raise NotImplementedError
+
+    def start(self):
+        """开始出帧"""
+
+    def read_into(self, out):
+        """读取一帧写入 out"""
+        raise NotImplementedError
+
+    def capture_still(self, timeout=1.0):
+        """拍一张高清照片（格式见 still_format）；不支持时返回 None，由调用方退回使用检测帧"""
+        return None
+
+    def stop(self):
+        """停止出帧并释放资源"""
+
+
+def _compact_i420(array, width, height):
+    """去掉 YUV420 缓冲区每行末尾的填充，返回连续的 I420 数组 (高*3/2, 宽)
+
+    picamera2 按行跨度(stride)给出 (高*3/2, stride) 的数组，U、V 平面每行跨度为 stride/2，
+    两行色度挤在数组的一行里
+    """
+    stride = array.shape[1]
+    if stride == width:
+        return array
+    out = np.empty((height * 3 // 2, width), np.uint8)
+    out[:height] = array[:height, :width]
+    chroma = array[height:height * 3 // 2].reshape(height, stride // 2)[:, :width // 2]
+    out[height:] = chroma.reshape(height // 2, width)
+    return out
+
+
+class Picamera2Source(FrameSource):
+    """树莓派摄像头（picamera2）
+
+    pixel_format='YUV420' 时按传感器输出的原生格式采集，检测直接使用 Y 平面，
+    省掉每帧的 RGB->BGR 和 BGR->GRAY 两次整帧转换。
+
+    指定 still_size 时使用双流配置：size 大小的 lores 流（YUV420）送检测，
+    still_size 大小的 main 流（YUV420）平时不取，只在 capture_still() 时从同一请求中拷出，
+    上传时直接从 I420 平面编码，只有情绪识别、穿搭直方图等需要时才转成BGR
+    """
+
+    def __init__(self, size=(640, 480), frame_rate=30, hflip=True, vflip=True,
+                 pixel_format='YUV420', still_size=None):
+        self.size = size
+        self.frame_rate = frame_rate
+        self.hflip = hflip
+        self.vflip = vflip
+        self.pixel_format = 'YUV420' if still_size else pixel_format
+        self.still_size = still_size
+        self.still_format = 'YUV420'
+        self.stream = 'lores' if still_size else 'main'
+        self.picam2 = None
+
+        # 高清照片请求（由取帧线程在下一帧完成）
+        self._still = None
+        self._still_wanted = threading.Event()
+        self._still_ready = threading.Event()
+
+    def open(self):
+        # 只有树莓派上才有这两个库，延迟导入
+        from picamera2 import Picamera2
+        from libcamera import Transform
+
+        stream = {"size": self.size}
+        if self.pixel_format == 'YUV420':
+            # 宽度不是64的倍数时每行有填充，I420 平面无法直接当连续数组使用
+            if self.size[0] % 64:
+                raise ValueError(f"YUV420 采集宽度需为64的倍数: {self.size}")
+            stream["format"] = "YUV420"
+
+        if self.still_size:
+            main, lores = {"size": self.still_size, "format": "YUV420"}, stream
+        else:
+            main, lores = stream, None
+
+        self.picam2 = Picamera2()
+        config = self.picam2.create_preview_configuration(
+            main=main,
+            lores=lores,
+            controls={"FrameRate": self.frame_rate},
+            transform=Transform(hflip=self.hflip, vflip=self.vflip)
+        )
+        self.picam2.configure(config)
+        width, height = self.size
+        if self.pixel_format == 'YUV420':
+            self.shape = (height * 3 // 2, width)
+        else:
+            self.shape = (height, width, 3)
+
+    def start(self):
+        self.picam2.start()
+
+    def read_into(self, out):
+        from picamera2 import MappedArray
+
+        request = self.picam2.capture_request()
+        try:
+            with MappedArray(request, self.stream) as m:
+                if self.pixel_format == 'YUV420':
+                    # 原样拷贝 I420 数据，不做颜色转换
+                    np.copyto(out, m.array)
+                else:
+                    # 转换为BGR格式用于OpenCV处理
+                    cv2.cvtColor(m.array, cv2.COLOR_RGB2BGR, dst=out)
+
+            if self._still_wanted.is_set():
+                # 有人请求高清照片：从同一请求中拷出 main 流（I420，不做颜色转换）
+                self._still = _compact_i420(request.make_array('main'), *self.still_size)
+                self._still_wanted.clear()
+                self._still_ready.set()
+        finally:
+            request.release()
+        return True
+
+    def capture_still(self, timeout=1.0):
+        """请求取帧线程在下一帧拍一张高清照片"""
+        if not self.still_size:
+            return None
+        self._still_ready.clear()
+        self._still_wanted.set()
+        if not self._still_ready.wait(timeout):
+            self._still_wanted.clear()
+            logger.warning("拍摄高清照片超时")
+            return None
+        still, self._still = self._still, None
+        return still
+
+    def stop(self):
+        if self.picam2:
+            self.picam2.stop()
+
+
+class VideoCaptureSource(FrameSource):
+    """OpenCV VideoCapture（USB摄像头、网络流等）"""
+
+    def __init__(self, device=0, size=(640, 480)):
+        self.device = device
+        self.size = size
+        self.cap = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.device)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"无法打开视频设备: {self.device}")
+        width, height = self.size
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.shape = (height, width, 3)
+
+    def read_into(self, out):
+        ok, image = self.cap.read(out)
+        if not ok:
+            return False
+        if image is not out:
+            # 设备不支持请求的分辨率时缩放到缓冲区尺寸
+            cv2.resize(image, (out.shape[1], out.shape[0]), dst=out)
+        return True
+
+    def stop(self):
+        if self.cap:
+            self.cap.release()
+
+
+class ReplaySource(FrameSource):
+    """回放图片目录或视频文件
+
+    fps 为 None 时全速回放，否则按指定帧率节拍出帧；
+    preload=True 时预先把图片读入内存，排除磁盘IO对测量的干扰
+    """
+
+    def __init__(self, path, fps=None, loop=False, size=(640, 480), preload=False):
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+        self.size = size
+        self.preload = preload
+        self.files = []
+        self.images = []
+        self.cap = None
+        self.index = 0
+        self.frames_read = 0
+        self._start_time = 0.0
+
+    def open(self):
+        if os.path.isdir(self.path):
+            self.files = sorted(
+                os.path.join(self.path, name) for name in os.listdir(self.path)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            if not self.files:
+                raise RuntimeError(f"目录中没有图片: {self.path}")
+            if self.preload:
+                self.images = [cv2.imread(f) for f in self.files]
+        else:
+            self.cap = cv2.VideoCapture(self.path)
+            if not self.cap.isOpened():
+                raise RuntimeError(f"无法打开视频文件: {self.path}")
+        width, height = self.size
+        self.shape = (height, width, 3)
+        self.finished = False
+
+    def start(self):
+        self.index = 0
+        self.frames_read = 0
+        self._start_time = time.monotonic()
+
+    def _next_image(self):
+        """取下一张原始图像，回放结束返回 None"""
+        if self.cap is not None:
+            ok, image = self.cap.read()
+            if not ok and self.loop:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, image = self.cap.read()
+            return image if ok else None
+
+        if self.index >= len(self.files):
+            if not self.loop:
+                return None
+            self.index = 0
+        i = self.index
+        self.index += 1
+        return self.images[i] if self.preload else cv2.imread(self.files[i])
+
+    def read_into(self, out):
+        if self.fps:
+            # 按帧率节拍出帧
+            delay = self._start_time + self.frames_read / self.fps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        image = self._next_image()
+        if image is None:
+            self.finished = True
+            return False
+        if image.shape == out.shape:
+            np.copyto(out, image)
+        else:
+            cv2.resize(image, (out.shape[1], out.shape[0]), dst=out)
+        self.frames_read += 1
+        return True
+
+    def stop(self):
+        if self.cap:
+            self.cap.release()
+
+
+def create_frame_source(spec, size=(640, 480), fps=None, pixel_format='YUV420', still_size=None):
+    """按字符串创建帧源
+
+    picamera            树莓派摄像头
+    video:<设备号|URL>   OpenCV VideoCapture
+    replay:<目录|文件>   回放录制的画面
+    """
+    kind, _, arg = spec.partition(':')
+    if kind == 'picamera':
+        return Picamera2Source(size=size, pixel_format=pixel_format, still_size=still_size)
+    if kind == 'video':
+        device = int(arg) if arg.isdigit() else arg
+        return VideoCaptureSource(device=device, size=size)
+    if kind == 'replay':
+        return ReplaySource(arg, fps=fps, size=size, preload=True)
+    raise ValueError(f"未知的帧源: {spec}")
@@ -0,0 +1,159 @@
+"""
+共享HTTP客户端
+所有对外请求（豆包、TTS、天气、定位）共用一个长连接 Session：
+按主机复用连接池、保持 keep-alive、启动和有人靠近时预热连接、按主机设置重试退避策略，
+并统计新建连接（TCP+TLS握手）的次数和耗时
+"""
+
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+def retry_policy(retries=2, backoff=0.3, retry_post=False):
+    """重试策略：连接失败和 429/5xx 按指数退避重试
+
+    读超时不重试（请求可能已被服务端处理）；retry_post=True 时 POST 也按上述条件重试
+    """
+    return Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=None if retry_post else Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False
+    )
+
+
+class ConnectionStats:
+    """按主机统计新建连接次数、建连耗时和请求数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connects = {}
+        self.connect_time = {}
+        self.requests = {}
+
+    def record_connect(self, host, seconds):
+        with self.lock:
+            self.connects[host] = self.connects.get(host, 0) + 1
+            self.connect_time[host] = self.connect_time.get(host, 0.0) + seconds
+
+    def record_request(self, host):
+        with self.lock:
+            self.requests[host] = self.requests.get(host, 0) + 1
+
+    def summary(self):
+        with self.lock:
+            return {
+                host: {
+                    'requests': self.requests.get(host, 0),
+                    'connects': self.connects.get(host, 0),
+                    'connect_ms': self.connect_time.get(host, 0.0) * 1000,
+                }
+                for host in set(self.requests) | set(self.connects)
+            }
+
+
+def _timed(connection_cls, stats):
+    """给连接类加上建连计时（HTTPS 的 connect() 包含 TLS 握手）"""
+    class TimedConnection(connection_cls):
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                super().connect()
+            finally:
+                stats.record_connect(self.host, time.perf_counter() - start)
+    return TimedConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """连接池使用带计时的连接类"""
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+
+        class TimedHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = _timed(HTTPConnection, self.stats)
+
+        class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = _timed(HTTPSConnection, self.stats)
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+
+class HttpClient:
+    """长连接HTTP客户端，线程间共享"""
+
+    def __init__(self, pool_maxsize=4, retry=None):
+        self.pool_maxsize = pool_maxsize  # 每个主机最多保持的连接数
+        self.stats = ConnectionStats()
+        self.session = requests.Session()
+        self.session.hooks['response'].append(self._on_response)
+        adapter = self._adapter(retry or retry_policy())
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.prewarm_urls = []
+        self._last_prewarm = 0.0
+
+    def _adapter(self, retry, pool_maxsize=None):
+        return _TimedAdapter(
+            self.stats,
+            pool_connections=8,
+            pool_maxsize=pool_maxsize or self.pool_maxsize,
+            max_retries=retry
+        )
+
+    def mount(self, prefix, retry=None, pool_maxsize=None, prewarm=True):
+        """为某个主机单独设置重试策略和连接池大小"""
+        self.session.mount(prefix, self._adapter(retry or retry_policy(), pool_maxsize))
+        if prewarm:
+            self.prewarm_urls.append(prefix)
+
+    def _on_response(self, response, *args, **kwargs):
+        self.stats.record_request(urlsplit(response.url).hostname)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def prewarm(self, min_interval=30.0):
+        """在后台为各主机提前建好连接，min_interval 秒内不重复预热"""
+        now = time.monotonic()
+        if now - self._last_prewarm < min_interval:
+            return
+        self._last_prewarm = now
+        thread = threading.Thread(target=self._prewarm_worker)
+        thread.daemon = True
+        thread.start()
+
+    def _prewarm_worker(self):
+        for url in self.prewarm_urls:
+            try:
+                # 只为建立连接，响应内容不关心
+                self.session.head(url, timeout=3).close()
+            except requests.RequestException as e:
+                logger.debug(f"预热连接失败 {url}: {e}")
+
+    def close(self):
+        self.session.close()
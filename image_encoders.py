@@ -0,0 +1,101 @@
+"""
+图像编码后端
+上传前的 JPEG/WebP 编码按名字注册和创建，UploadEncoder 不再绑定 cv2.imencode；
+libjpeg-turbo（PyTurboJPEG）可以直接从 I420 平面编码 JPEG，YUV 采集时省掉转 BGR 这一步。
+可以用 bench_encoders.py 在录好的画面上实测对比
+"""
+
+import logging
+
+import cv2
+
+from regions import pad_i420
+
+logger = logging.getLogger(__name__)
+
+ENCODER_BACKENDS = {}
+
+
+def register_backend(name):
+    """注册编码后端的装饰器"""
+    def decorator(cls):
+        cls.name = name
+        ENCODER_BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def create_backend(name='auto', **kwargs):
+    """按名字创建编码后端；auto 时优先 turbojpeg，装不上再用 opencv"""
+    if name == 'auto':
+        try:
+            return ENCODER_BACKENDS['turbojpeg'](**kwargs)
+        except Exception as e:
+            logger.info(f"TurboJPEG 不可用({e})，使用 OpenCV 编码")
+            return ENCODER_BACKENDS['opencv'](**kwargs)
+    if name not in ENCODER_BACKENDS:
+        raise ValueError(f"未知的编码后端: {name}，可选: auto, {', '.join(ENCODER_BACKENDS)}")
+    return ENCODER_BACKENDS[name](**kwargs)
+
+
+class EncoderBackend:
+    """编码后端接口
+
+    encode(image, image_format, quality) 编码 BGR 图，
+    encode_i420(yuv, width, height, image_format, quality) 编码 I420 平面（高为 height*3/2 的单通道数组）；
+    返回支持缓冲区协议的对象（bytes 或 numpy 数组）。formats 为支持的格式
+    """
+
+    name = None
+    formats = ('jpeg',)
+
+    def encode(self, image, image_format, quality):
+        raise NotImplementedError
+
+    def encode_i420(self, yuv, width, height, image_format, quality):
+        """默认先转成 BGR 再编码"""
+        return self.encode(cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR_I420), image_format, quality)
+
+
+@register_backend('opencv')
+class OpenCVBackend(EncoderBackend):
+    """cv2.imencode"""
+
+    formats = ('jpeg', 'webp')
+    EXTENSIONS = {
+        'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY),
+        'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY),
+    }
+
+    def encode(self, image, image_format, quality):
+        ext, flag = self.EXTENSIONS[image_format]
+        ok, buffer = cv2.imencode(ext, image, [flag, quality])
+        if not ok:
+            raise ValueError(f"图像编码失败({image_format})")
+        return buffer
+
+
+@register_backend('turbojpeg')
+class TurboJPEGBackend(EncoderBackend):
+    """libjpeg-turbo（需要 pip install PyTurboJPEG 和系统的 libturbojpeg）
+
+    I420 输入直接按 4:2:0 采样编码，不做颜色空间转换；
+    encode_from_yuv 固定按 4 字节对齐的行宽读取平面，宽不是 8 的倍数时先补齐行宽
+    """
+
+    formats = ('jpeg',)
+
+    def __init__(self, lib_path=None):
+        # 可选依赖，延迟导入
+        import turbojpeg
+        self._tj = turbojpeg
+        self.jpeg = turbojpeg.TurboJPEG(lib_path)
+
+    def encode(self, image, image_format, quality):
+        return self.jpeg.encode(image, quality=quality, pixel_format=self._tj.TJPF_BGR,
+                                jpeg_subsample=self._tj.TJSAMP_420)
+
+    def encode_i420(self, yuv, width, height, image_format, quality):
+        yuv = pad_i420(yuv, width, height)
+        return self.jpeg.encode_from_yuv(yuv, height, width, quality=quality,
+                                         jpeg_subsample=self._tj.TJSAMP_420)
@@ -0,0 +1,116 @@
+"""
+大模型流式输出处理
+解析 chat completions 的 SSE 流（stream: true），按中文句末标点切句，
+每凑齐一句就交给TTS，不用等整段文本生成完。
+多人夸奖时每位的夸奖以【N】开头，split_person_tags() 按标记把句子归到对应的人
+"""
+
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_ENDINGS = '。！？!?；;…\n'
+CLOSING_MARKS = '”’"\'）)」』】'
+PERSON_TAG = re.compile(r'【第?(\d+)位?】')
+
+
+class SentenceSplitter:
+    """把流式文本切成完整的句子
+
+    太短的句子（如"哇！"）并入下一句，避免TTS一次只读一两个字
+    """
+
+    def __init__(self, min_length=6):
+        self.min_length = min_length
+        self.buffer = ''
+
+    def feed(self, text):
+        """追加一段文本，返回已经完整的句子列表"""
+        self.buffer += text
+        sentences = []
+        start = 0
+        i = 0
+        while i < len(self.buffer):
+            if self.buffer[i] in SENTENCE_ENDINGS:
+                end = i + 1
+                # 连续的标点以及紧跟的引号、括号都归到本句
+                while end < len(self.buffer) and self.buffer[end] in SENTENCE_ENDINGS + CLOSING_MARKS:
+                    end += 1
+                if end == len(self.buffer):
+                    # 标点在末尾时后面可能还有引号或省略号没传完，等下一段
+                    break
+                sentence = self.buffer[start:end].strip()
+                if len(sentence) >= self.min_length:
+                    sentences.append(sentence)
+                    start = end
+                i = end
+            else:
+                i += 1
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        """流结束时返回剩下的文本"""
+        rest, self.buffer = self.buffer.strip(), ''
+        return rest
+
+
+def split_person_tags(text, current=None):
+    """按【N】标记切分多人夸奖，返回 [(第几位, 去掉标记的文本)]；标记之前的部分归 current"""
+    parts = PERSON_TAG.split(text)
+    segments = []
+    if parts[0].strip():
+        segments.append((current, parts[0].strip()))
+    for i in range(1, len(parts), 2):
+        current = int(parts[i])
+        if parts[i + 1].strip():
+            segments.append((current, parts[i + 1].strip()))
+    return segments
+
+
+def parse_sse_line(line):
+    """解析一行SSE数据，返回 (是否结束, 增量文本或 None)"""
+    if not line or not line.startswith('data:'):
+        return False, None
+    data = line[5:].strip()
+    if data == '[DONE]':
+        return True, None
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError as e:
+        logger.warning(f"SSE数据解析失败: {e}")
+        return False, None
+    choices = chunk.get('choices') or []
+    if not choices:
+        return False, None
+    return False, (choices[0].get('delta') or {}).get('content') or None
+
+
+def iter_sse_deltas(response):
+    """从 chat completions 的 SSE 响应中逐段取出增量文本"""
+    # text/event-stream 没有声明编码时 requests 会按 ISO-8859-1 解码，中文会乱码
+    response.encoding = 'utf-8'
+    lines = response.iter_lines(decode_unicode=True)
+    for line in lines:
+        done, content = parse_sse_line(line)
+        if done:
+            # 读完 [DONE] 之后剩下的响应体（通常只剩分块结束标记），
+            # 没读完就关闭的响应会把连接丢掉，下次请求要重新握手
+            for _ in lines:
+                pass
+            break
+        if content:
+            yield content
+
+
+def iter_sentences(response, min_length=6):
+    """按句产出流式响应的文本"""
+    splitter = SentenceSplitter(min_length=min_length)
+    for delta in iter_sse_deltas(response):
+        for sentence in splitter.feed(delta):
+            yield sentence
+    rest = splitter.flush()
+    if rest:
+        yield rest
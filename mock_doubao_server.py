@@ -0,0 +1,74 @@
+"""
+本地模拟豆包 chat completions 接口
+支持 stream: true 的 SSE 输出，可以在没有网络和API密钥时测试流式夸奖和首句延迟
+
+用法:
+    python mock_doubao_server.py [端口] [每段间隔秒数]
+    python fashionMirrorMain.py --doubao-url http://127.0.0.1:8000/api/v3/chat/completions
+"""
+
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "哇！你这身搭配真是太有品味了！颜色的搭配非常和谐，整体造型既时尚又显气质。今天的你简直闪闪发光！"
+
+
+class MockDoubaoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    delay = 0.05  # 每段增量文本之间的间隔，模拟生成速度
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        if not request.get('stream'):
+            body = json.dumps({
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": REPLY}}]
+            }, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        # SSE 流式输出，用分块编码保持长连接
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i in range(0, len(REPLY), 3):
+            delta = {"choices": [{"index": 0, "delta": {"content": REPLY[i:i + 3]}}]}
+            self._send_event(json.dumps(delta, ensure_ascii=False))
+            time.sleep(self.delay)
+        self._send_event('[DONE]')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def do_HEAD(self):
+        # 连接预热
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_event(self, data):
+        payload = f"data: {data}\n\n".encode('utf-8')
+        self.wfile.write(f"{len(payload):x}\r\n".encode('ascii') + payload + b'\r\n')
+        self.wfile.flush()
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    if len(sys.argv) > 2:
+        MockDoubaoHandler.delay = float(sys.argv[2])
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockDoubaoHandler)
+    print(f"模拟豆包接口: http://127.0.0.1:{port}/api/v3/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+运动门控
+在人脸检测之前先做一次很便宜的缩小帧差分，画面静止时直接跳过检测，
+降低没人时的CPU占用和发热
+"""
+
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MotionGate:
+    """基于缩小帧差分的运动门控
+
+    每帧缩小到 size 后存入长度为 history 的环形队列，和队列中最旧的一帧做差分；
+    变化像素占比超过 min_area 视为有运动。检测到运动后门保持打开 hold_frames 帧，
+    避免人停下来不动时检测立刻中断
+    """
+
+    def __init__(self, size=(80, 60), history=4, threshold=15, min_area=0.01,
+                 hold_frames=15, enabled=True):
+        self.size = size
+        self.history = history
+        self.threshold = threshold  # 单个像素的亮度变化阈值
+        self.min_area = min_area  # 变化像素占比阈值
+        self.hold_frames = hold_frames
+        self.enabled = enabled
+
+        width, height = size
+        self._ring = np.zeros((history, height, width), np.uint8)
+        self._diff = np.empty((height, width), np.uint8)
+        self._index = 0
+        self._filled = 0
+        self._hold = 0
+
+        # 统计信息
+        self.frames = 0
+        self.skipped = 0
+        self.last_motion = 0.0
+
+    def check(self, gray):
+        """传入灰度帧，返回本帧是否需要做人脸检测"""
+        self.frames += 1
+        if not self.enabled:
+            return True
+
+        # 缩小后直接写进环形队列的槽位，不额外分配内存
+        current = self._ring[self._index]
+        cv2.resize(gray, self.size, dst=current, interpolation=cv2.INTER_AREA)
+        oldest = self._ring[(self._index + 1) % self.history]
+        self._index = (self._index + 1) % self.history
+
+        if self._filled < self.history:
+            # 队列还没填满，先放行
+            self._filled += 1
+            return True
+
+        cv2.absdiff(current, oldest, dst=self._diff)
+        cv2.threshold(self._diff, self.threshold, 255, cv2.THRESH_BINARY, dst=self._diff)
+        self.last_motion = cv2.countNonZero(self._diff) / float(self._diff.size)
+
+        if self.last_motion >= self.min_area:
+            self._hold = self.hold_frames
+            return True
+        if self._hold > 0:
+            self._hold -= 1
+            return True
+
+        self.skipped += 1
+        return False
+
+    def open(self):
+        """外部强制打开门（例如正在跟踪人脸）"""
+        self._hold = self.hold_frames
+
+    @property
+    def skip_ratio(self):
+        """跳过检测的帧占比"""
+        return self.skipped / self.frames if self.frames else 0.0
@@ -0,0 +1,276 @@
+"""
+分阶段的夸夸流水线
+编码 -> 上下文 -> 大模型 -> TTS -> 播放，每个阶段有自己的工作线程和有界队列，
+阶段函数可以返回一个结果，也可以是生成器逐个产出（如逐句文本、逐块音频），产出立即交给下一阶段。
+每个阶段统计排队时间和处理时间的直方图，便于调整并发度和队列长度
+"""
+
+import bisect
+import inspect
+import itertools
+import logging
+import threading
+import time
+from queue import Full, Queue
+
+logger = logging.getLogger(__name__)
+
+# 直方图分桶上限(毫秒)
+LATENCY_BUCKETS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class LatencyHistogram:
+    """固定分桶的延迟直方图，百分位数按所在桶的上限估计"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.count += 1
+            self.total += ms
+            self.max = max(self.max, ms)
+
+    def percentile(self, p):
+        """第 p 百分位(0-100)的延迟(毫秒)"""
+        with self.lock:
+            if not self.count:
+                return 0.0
+            rank = self.count * p / 100
+            for i, n in enumerate(itertools.accumulate(self.counts)):
+                if n >= rank:
+                    return self.buckets[i] if i < len(self.buckets) else self.max
+            return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'avg_ms': self.total / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'max_ms': self.max,
+        }
+
+
+class Job:
+    """一次夸夸任务，在各阶段之间传递"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, payload):
+        self.id = next(self._ids)
+        self.payload = payload
+        self.created = time.monotonic()
+        self.first_output = None  # 最后一个阶段第一次收到数据的时间
+        self.data = {}  # 各阶段之间共享的数据
+        self.error = None
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._pending = 0  # 还在队列中或正在处理的数据项数，归零即任务结束
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """取消任务：尚未处理的数据项直接丢弃，生成器阶段在下一次产出时停止"""
+        self._cancelled.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+class _Stage:
+    def __init__(self, name, fn, workers, queue_size):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue = Queue(maxsize=queue_size)
+        self.threads = []
+        self.next = None
+        self.wait_hist = LatencyHistogram()  # 在队列中等待的时间
+        self.service_hist = LatencyHistogram()  # 处理时间（不含等下游队列的时间）
+        self.items = 0
+        self.errors = 0
+        self.dropped = 0  # 因任务取消丢弃的数据项
+
+
+class Pipeline:
+    """按添加顺序串联的阶段，最后一个阶段的产出被丢弃
+
+    同一任务的多个数据项需要保持顺序的阶段（如逐句TTS、播放）只能用一个工作线程
+    """
+
+    def __init__(self, on_done=None):
+        self.stages = []
+        self.on_done = on_done  # 任务结束（完成、失败或取消）时调用，参数为 Job
+        self.active = {}
+        self.lock = threading.Lock()
+        self.is_running = False
+        self.total_hist = LatencyHistogram()  # 提交到结束
+        self.first_output_hist = LatencyHistogram()  # 提交到最后一个阶段收到第一项（首次出声）
+        self.submitted = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    def add_stage(self, name, fn, workers=1, queue_size=2):
+        """添加阶段，fn(job, item) 返回下一阶段的输入，返回 None 表示没有产出"""
+        stage = _Stage(name, fn, workers, queue_size)
+        if self.stages:
+            self.stages[-1].next = stage
+        self.stages.append(stage)
+        return self
+
+    @property
+    def busy(self):
+        return bool(self.active)
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        for stage in self.stages:
+            for i in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(stage,),
+                                          name=f"pipeline-{stage.name}-{i}")
+                thread.daemon = True
+                thread.start()
+                stage.threads.append(thread)
+
+    def submit(self, payload):
+        """提交任务，第一阶段队列已满时拒绝并返回 None"""
+        job = Job(payload)
+        job._pending = 1
+        first = self.stages[0]
+        with self.lock:
+            self.active[job.id] = job
+        try:
+            first.queue.put_nowait((job, payload, time.monotonic()))
+        except Full:
+            with self.lock:
+                del self.active[job.id]
+            self.rejected += 1
+            logger.warning(f"流水线繁忙，丢弃任务 {job.id}")
+            return None
+        self.submitted += 1
+        return job
+
+    def cancel_all(self):
+        """取消所有进行中的任务"""
+        with self.lock:
+            jobs = list(self.active.values())
+        for job in jobs:
+            if not job.cancelled:
+                job.cancel()
+                self.cancelled += 1
+        return len(jobs)
+
+    def _forward(self, stage, job, item):
+        """把一项产出交给下一阶段，返回等待下游队列的时间"""
+        if stage.next is None or item is None:
+            return 0.0
+        with job._lock:
+            job._pending += 1
+        start = time.monotonic()
+        stage.next.queue.put((job, item, start))
+        return time.monotonic() - start
+
+    def _worker(self, stage):
+        while True:
+            entry = stage.queue.get()
+            if entry is None:
+                break
+            job, item, enqueued = entry
+            start = time.monotonic()
+            stage.wait_hist.observe(start - enqueued)
+
+            blocked = 0.0
+            if job.cancelled:
+                stage.dropped += 1
+            else:
+                if stage.next is None and job.first_output is None:
+                    job.first_output = start
+                    self.first_output_hist.observe(start - job.created)
+                try:
+                    result = stage.fn(job, item)
+                    if inspect.isgenerator(result):
+                        try:
+                            for output in result:
+                                if job.cancelled:
+                                    break
+                                blocked += self._forward(stage, job, output)
+                        finally:
+                            result.close()
+                    else:
+                        blocked += self._forward(stage, job, result)
+                    stage.items += 1
+                except Exception as e:
+                    stage.errors += 1
+                    job.error = e
+                    logger.error(f"流水线阶段 {stage.name} 处理任务 {job.id} 出错: {e}")
+                stage.service_hist.observe(time.monotonic() - start - blocked)
+            self._release(job)
+
+    def _release(self, job):
+        """一个数据项处理完毕，任务的所有数据项都处理完时结束任务"""
+        with job._lock:
+            job._pending -= 1
+            finished = job._pending == 0
+        if not finished:
+            return
+        self.total_hist.observe(time.monotonic() - job.created)
+        try:
+            if self.on_done:
+                self.on_done(job)
+        except Exception as e:
+            logger.error(f"流水线任务 {job.id} 结束回调出错: {e}")
+        finally:
+            with self.lock:
+                self.active.pop(job.id, None)
+            job._done.set()
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'cancelled': self.cancelled,
+            'total': self.total_hist.summary(),
+            'first_output': self.first_output_hist.summary(),
+            'stages': {
+                stage.name: {
+                    'items': stage.items,
+                    'errors': stage.errors,
+                    'dropped': stage.dropped,
+                    'queue_depth': stage.queue.qsize(),
+                    'wait': stage.wait_hist.summary(),
+                    'service': stage.service_hist.summary(),
+                }
+                for stage in self.stages
+            },
+        }
+
+    def stop(self, timeout=1.0):
+        """取消进行中的任务并结束所有工作线程"""
+        self.cancel_all()
+        self.is_running = False
+        for stage in self.stages:
+            for _ in stage.threads:
+                try:
+                    stage.queue.put(None, timeout=timeout)
+                except Full:
+                    pass
+        for stage in self.stages:
+            for thread in stage.threads:
+                thread.join(timeout=timeout)
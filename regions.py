@@ -0,0 +1,76 @@
+"""
+检测框几何和 I420 裁剪
+检测结果（每个人的裁剪图）和上传编码共用：由人脸框推算人物区域，
+以及在 I420 平面上直接裁剪缩放，不必先把整帧转成 BGR
+"""
+
+import cv2
+import numpy as np
+
+
+def person_box(boxes, target, width, height, margin=0.15):
+    """包住所有人的裁剪区域 (x0, y0, x1, y1)
+
+    人脸框向下扩展到躯干和腿（约 7 倍脸高）、左右各扩 1.5 倍脸宽；人体框四周留 margin 的边
+    """
+    regions = []
+    for x, y, w, h in boxes:
+        if target == 'face':
+            regions.append((x - 1.5 * w, y - 0.6 * h, x + 2.5 * w, y + 7 * h))
+        else:
+            regions.append((x - margin * w, y - margin * h, x + (1 + margin) * w, y + (1 + margin) * h))
+    x0 = max(0, int(min(r[0] for r in regions)))
+    y0 = max(0, int(min(r[1] for r in regions)))
+    x1 = min(width, int(max(r[2] for r in regions)))
+    y1 = min(height, int(max(r[3] for r in regions)))
+    return x0, y0, x1, y1
+
+
+def pad_i420(yuv, width, height, align=4):
+    """紧凑 I420 转成每行按 align 字节对齐的平面（Y 行宽 PAD(w)，U/V 行宽 PAD(w/2)）；
+    已对齐时原样返回
+    """
+    y_stride = -(-width // align) * align
+    c_stride = -(-(width // 2) // align) * align
+    if y_stride == width and c_stride == width // 2:
+        return yuv
+    y, u, v = i420_planes(yuv)
+    y_size, c_size = y_stride * height, c_stride * (height // 2)
+    out = np.zeros(y_size + 2 * c_size, np.uint8)
+    out[:y_size].reshape(height, y_stride)[:, :width] = y
+    out[y_size:y_size + c_size].reshape(height // 2, c_stride)[:, :width // 2] = u
+    out[y_size + c_size:].reshape(height // 2, c_stride)[:, :width // 2] = v
+    return out
+
+
+def i420_planes(yuv):
+    """I420 数组 (高*3/2, 宽) 的 Y、U、V 平面视图"""
+    height, width = yuv.shape[0] * 2 // 3, yuv.shape[1]
+    quarter = height // 4
+    return (
+        yuv[:height],
+        yuv[height:height + quarter].reshape(height // 2, width // 2),
+        yuv[height + quarter:height + 2 * quarter].reshape(height // 2, width // 2),
+    )
+
+
+def crop_i420(yuv, rect, size=None):
+    """在 I420 平面上分别裁剪（并缩放到 size），返回新的 I420 数组
+
+    色度平面是亮度的一半，裁剪起点取偶数、高取 4 的倍数，保证平面对齐；
+    宽取 8 的倍数，使 U/V 行宽也是 4 的倍数（libjpeg-turbo 按 4 字节对齐的行宽读取 YUV 平面）
+    """
+    x0, y0, x1, y1 = rect
+    x0, y0 = x0 & ~1, y0 & ~1
+    x1, y1 = x0 + (x1 - x0) // 8 * 8, y0 + (y1 - y0) // 4 * 4
+    out_w, out_h = size or (x1 - x0, y1 - y0)
+    out_w, out_h = max(8, out_w // 8 * 8), max(4, out_h // 4 * 4)
+
+    out = np.empty((out_h * 3 // 2, out_w), np.uint8)
+    for div, plane, dst in zip((1, 2, 2), i420_planes(yuv), i420_planes(out)):
+        src = plane[y0 // div:y1 // div, x0 // div:x1 // div]
+        if src.shape == dst.shape:
+            dst[:] = src
+        else:
+            dst[:] = cv2.resize(src, (dst.shape[1], dst.shape[0]), interpolation=cv2.INTER_AREA)
+    return out
@@ -0,0 +1,75 @@
+"""
+自适应检测调度
+根据系统状态（无人 / 有人 / 冷却中 / 正在夸奖）决定检测频率，
+按每帧的时间预算休眠，代替固定的 time.sleep(0.1)
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+IDLE = 'idle'  # 没人，只靠运动门控盯着
+PRESENT = 'present'  # 有人，尽快反应
+COOLDOWN = 'cooldown'  # 冷却中，检测结果不会触发任何动作
+BUSY = 'busy'  # 夸奖流程进行中
+
+DEFAULT_RATES = {
+    IDLE: 10.0,
+    PRESENT: 15.0,
+    COOLDOWN: 1.0,
+    BUSY: 2.0,
+}
+
+
+class DetectionScheduler:
+    """按状态设定目标帧率，每帧结束时只休眠预算剩下的时间"""
+
+    def __init__(self, rates=None, enabled=True):
+        self.rates = dict(DEFAULT_RATES)  # 各状态的目标检测帧率
+        if rates:
+            self.rates.update(rates)
+        self.enabled = enabled  # 关闭后不休眠，只统计（全速回放录像时使用）
+        self.state = IDLE
+        self._frame_start = time.monotonic()
+
+        # 统计信息
+        self.frames = {state: 0 for state in self.rates}
+        self.overruns = {state: 0 for state in self.rates}  # 处理时间超出预算的帧数
+        self.busy_time = 0.0
+        self.sleep_time = 0.0
+
+    def begin_frame(self):
+        """一帧处理开始时调用"""
+        self._frame_start = time.monotonic()
+
+    def set_state(self, state):
+        if state != self.state:
+            logger.info(f"检测调度: {self.state} -> {state} ({self.rates[state]:.0f} fps)")
+            self.state = state
+
+    @property
+    def frame_budget(self):
+        """当前状态下每帧的时间预算(秒)"""
+        return 1.0 / self.rates[self.state]
+
+    def end_frame(self):
+        """一帧处理结束时调用，休眠到本帧预算用完"""
+        elapsed = time.monotonic() - self._frame_start
+        self.frames[self.state] += 1
+        self.busy_time += elapsed
+        if not self.enabled:
+            return
+
+        remaining = self.frame_budget - elapsed
+        if remaining > 0:
+            time.sleep(remaining)
+            self.sleep_time += remaining
+        else:
+            self.overruns[self.state] += 1
+
+    @property
+    def duty_cycle(self):
+        """检测循环实际在干活的时间占比"""
+        total = self.busy_time + self.sleep_time
+        return self.busy_time / total if total > 0 else 0.0
@@ -6,7 +6,7 @@ sudo apt update
 sudo apt upgrade -y
 
 # 安装系统依赖
-sudo apt install -y python3-pip python3-venv libatlas-base-dev libjasper-dev libqtgui4 libqt4-test libhdf5-dev libhdf5-serial-dev libopenblas-dev
+sudo apt install -y python3-pip python3-venv libatlas-base-dev libjasper-dev libqtgui4 libqt4-test libhdf5-dev libhdf5-serial-dev libopenblas-dev ffmpeg libturbojpeg0
 
 # 创建虚拟环境
 python3 -m venv mirror_env
@@ -16,7 +16,7 @@ source mirror_env/bin/activate
 pip install --upgrade pip
 pip install numpy==1.24.3
 pip install opencv-python-headless==4.8.1.78
-pip install requests pygame deepface picamera2 pillow
+pip install requests aiohttp pygame deepface picamera2 pillow PyTurboJPEG
 
 echo "安装完成！"
 echo "激活虚拟环境: source mirror_env/bin/activate"
\ No newline at end of file
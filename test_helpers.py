@@ -0,0 +1,178 @@
+"""
+辅助模块的单元测试：I420 裁剪、SSE 解析和切句、帧环形缓冲区、上下文缓存
+用法: python -m pytest -q
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from context_cache import ContextCache
+from frame_buffer import FrameRingBuffer
+from llm_stream import SentenceSplitter, iter_sse_deltas, parse_sse_line
+from regions import crop_i420, i420_planes, pad_i420
+
+
+def _frame(width=640, height=480, seed=0):
+    rng = np.random.default_rng(seed)
+    bgr = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(bgr, (15, 15), 0)
+
+
+# ---- I420 裁剪 ----
+
+@pytest.mark.parametrize('rect', [(1, 3, 342, 457), (7, 11, 90, 77), (0, 0, 640, 480), (333, 201, 639, 479)])
+def test_crop_i420_aligns_odd_rects(rect):
+    yuv = cv2.cvtColor(_frame(), cv2.COLOR_BGR2YUV_I420)
+    out = crop_i420(yuv, rect)
+    height, width = out.shape[0] * 2 // 3, out.shape[1]
+    assert width % 8 == 0 and height % 4 == 0
+    assert out.shape[0] == height * 3 // 2
+
+    # 不缩放时和整帧转换后再裁剪完全一致
+    x0, y0 = rect[0] & ~1, rect[1] & ~1
+    full = cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR_I420)[y0:y0 + height, x0:x0 + width]
+    assert np.array_equal(cv2.cvtColor(out, cv2.COLOR_YUV2BGR_I420), full)
+
+
+def test_crop_i420_resizes_to_aligned_size():
+    yuv = cv2.cvtColor(_frame(), cv2.COLOR_BGR2YUV_I420)
+    out = crop_i420(yuv, (10, 10, 400, 470), (341, 409))
+    assert out.shape == (408 * 3 // 2, 336)
+
+
+def test_pad_i420_strides():
+    width, height = 340, 456
+    yuv = cv2.cvtColor(_frame(width, height), cv2.COLOR_BGR2YUV_I420)
+    padded = pad_i420(yuv, width, height)
+    # Y 行宽 PAD(340, 4) = 340，U/V 行宽 PAD(170, 4) = 172
+    y_size, c_size = 340 * height, 172 * (height // 2)
+    assert padded.size == y_size + 2 * c_size
+    y, u, v = i420_planes(yuv)
+    assert np.array_equal(padded[:y_size].reshape(height, 340), y)
+    assert np.array_equal(padded[y_size:y_size + c_size].reshape(height // 2, 172)[:, :170], u)
+    assert np.array_equal(padded[y_size + c_size:].reshape(height // 2, 172)[:, :170], v)
+
+    aligned = cv2.cvtColor(_frame(336, height), cv2.COLOR_BGR2YUV_I420)
+    assert pad_i420(aligned, 336, height) is aligned
+
+
+# ---- SSE 解析和切句 ----
+
+def test_parse_sse_line():
+    assert parse_sse_line('data: [DONE]') == (True, None)
+    assert parse_sse_line('') == (False, None)
+    assert parse_sse_line(': keep-alive') == (False, None)
+    assert parse_sse_line('data: {"choices": [{"delta": {"content": "你好"}}]}') == (False, '你好')
+    assert parse_sse_line('data: {"choices": []}') == (False, None)
+    assert parse_sse_line('data: {not json') == (False, None)
+
+
+def test_sentence_splitter_split_deltas():
+    splitter = SentenceSplitter(min_length=6)
+    sentences = []
+    for delta in ['哇！你这身', '搭配真是太有品', '味了！颜色', '很和谐。整体']:
+        sentences += splitter.feed(delta)
+    # "哇！"太短，并入下一句
+    assert sentences == ['哇！你这身搭配真是太有品味了！', '颜色很和谐。']
+    assert splitter.flush() == '整体'
+    assert splitter.flush() == ''
+
+
+def test_sentence_splitter_waits_for_closing_marks():
+    splitter = SentenceSplitter(min_length=2)
+    assert splitter.feed('他说“真好看！') == []
+    assert splitter.feed('”然后') == ['他说“真好看！”']
+    assert splitter.flush() == '然后'
+
+
+class _FakeResponse:
+    """只提供 iter_lines 的假响应，记录读到了第几行"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.consumed = 0
+        self.encoding = None
+
+    def iter_lines(self, decode_unicode=False):
+        for line in self.lines:
+            self.consumed += 1
+            yield line
+
+
+def test_iter_sse_deltas_reads_body_after_done():
+    response = _FakeResponse([
+        'data: {"choices": [{"delta": {"content": "你好"}}]}',
+        '',
+        'data: [DONE]',
+        '',
+        'data: {"choices": [{"delta": {"content": "不该出现"}}]}',
+    ])
+    assert list(iter_sse_deltas(response)) == ['你好']
+    # [DONE] 之后的响应体也要读完，连接才能放回连接池
+    assert response.consumed == len(response.lines)
+    assert response.encoding == 'utf-8'
+
+
+# ---- 帧环形缓冲区 ----
+
+def _write(buffer, value):
+    slot, out = buffer.begin_write()
+    assert slot is not None
+    out[:] = value
+    return buffer.commit(slot)
+
+
+def test_ring_buffer_pinned_slot_is_not_overwritten():
+    buffer = FrameRingBuffer(capacity=2, max_age=None)
+    buffer.allocate((2, 2))
+    _write(buffer, 1)
+    frame = buffer.latest()
+    assert frame.seq == 0
+
+    # 只剩一个空闲槽位：帧被占用期间生产者不覆盖它
+    _write(buffer, 2)
+    assert buffer.begin_write() == (None, None)
+    assert buffer.frames_dropped == 1
+    assert (frame.image == 1).all()
+
+    frame.release()
+    _write(buffer, 3)
+    assert (buffer.latest().image == 3).all()
+
+
+def test_ring_buffer_retain_needs_matching_release():
+    buffer = FrameRingBuffer(capacity=2, max_age=None)
+    buffer.allocate((2, 2))
+    _write(buffer, 1)
+    frame = buffer.latest().retain()
+    _write(buffer, 2)
+    frame.release()
+    assert buffer.begin_write() == (None, None)
+    frame.release()
+    slot, _ = buffer.begin_write()
+    assert slot == frame._slot
+
+
+def test_ring_buffer_latest_times_out():
+    buffer = FrameRingBuffer(capacity=2)
+    buffer.allocate((2, 2))
+    assert buffer.latest(timeout=0.01) is None
+    buffer.close()
+    assert buffer.latest() is None
+
+
+# ---- 上下文缓存 ----
+
+def test_context_cache_peek_does_not_load():
+    calls = []
+    cache = ContextCache()
+    cache.register('weather', lambda: calls.append(1) or {'weather': '晴'}, ttl=60, max_stale=120)
+    assert cache.peek('weather') is None
+    assert calls == []
+    assert cache.get('weather') == {'weather': '晴'}
+    assert cache.peek('weather') == {'weather': '晴'}
+    assert calls == [1]
+
+    cache.entries['weather'].updated -= 1000
+    assert cache.peek('weather') is None
@@ -0,0 +1,101 @@
+"""
+火山引擎流式TTS客户端
+构建请求、解析逐行返回的JSON音频流；主程序、asyncio 模式和备用夸奖资源包的构建脚本共用
+"""
+
+import base64
+import json
+
+
+class VolcanoTTS:
+    def __init__(self, http, audio_format='pcm', sample_rate=24000):
+        self.http = http  # HttpClient
+        self.audio_format = audio_format  # pcm 或 mp3
+        self.sample_rate = sample_rate
+
+    def request(self, text):
+        """构建TTS请求的地址、请求头和请求数据"""
+        url = "https://openspeech.bytedance.com/api/v3/tts/unidirectional"
+        headers = {
+            "X-Api-App-Id": "123",
+            "X-Api-Access-Key": "123",
+            "X-Api-Resource-Id": "seed-tts-2.0",
+            "Content-Type": "application/json",
+            "Connection": "keep-alive"
+        }
+        payload = {
+            "req_params":{
+                "text": text,
+                "speaker": "zh_female_meilinvyou_saturn_bigtts",
+                "audio_params": {
+                    "format": self.audio_format,
+                    "sample_rate": self.sample_rate,
+                    "enable_timestamp": True
+                },
+                "additions": "{\"explicit_language\":\"zh\",\"disable_markdown_filter\":true, \"enable_timestamp\":true}\"}"
+            }
+        }
+        return url, headers, payload
+    
+    def parse_line(self, line):
+        """解析TTS流的一行，返回 (是否结束, 音频数据或 None)"""
+        if not line:
+            return False, None
+        try:
+            data = json.loads(line)
+            
+            # 处理音频数据
+            if data.get("code", 0) == 0 and "data" in data and data["data"]:
+                chunk_audio = memoryview(base64.b64decode(data["data"]))
+                print(f"收到音频数据块，大小: {len(chunk_audio)} 字节")
+                return False, chunk_audio
+                
+            # 处理文本信息
+            elif data.get("code", 0) == 0 and "sentence" in data and data["sentence"]:
+                print(f"文本信息: {data['sentence']}")
+                
+            # 流结束
+            elif data.get("code", 0) == 20000000:
+                print("TTS流结束")
+                return True, None
+                
+            # 错误处理
+            elif data.get("code", 0) > 0:
+                print(f"TTS错误响应: {data}")
+                return True, None
+                
+        except json.JSONDecodeError as e:
+            print(f"JSON解析错误: {e}")
+        except Exception as e:
+            print(f"处理数据块时出错: {e}")
+        return False, None
+    
+    def iter_audio(self, text):
+        """调用TTS流式API，逐块产出音频数据"""
+        url, headers, payload = self.request(text)
+        response = None
+        try:
+            print('开始TTS流式请求...')
+            response = self.http.post(url, headers=headers, json=payload, stream=True, timeout=30)
+            print(f"响应状态码: {response.status_code}")
+            
+            logid = response.headers.get('X-Tt-Logid')
+            print(f"X-Tt-Logid: {logid}")
+
+            # 实时处理音频流
+            lines = response.iter_lines(decode_unicode=True)
+            for line in lines:
+                done, chunk_audio = self.parse_line(line)
+                if done:
+                    # 读完剩下的响应体，连接才能放回连接池给下一句复用
+                    for _ in lines:
+                        pass
+                    break
+                if chunk_audio is not None:
+                    yield chunk_audio
+
+        except Exception as e:
+            print(f"TTS请求失败: {e}")
+        finally:
+            if response is not None:
+                response.close()
@@ -0,0 +1,157 @@
+"""
+上传图片编码
+大模型只需要看清人和衣服，整张高清照片上传既慢又浪费流量：
+先按检测框裁出人物（留一些边），缩放到长边不超过 long_edge，
+再二分查找 JPEG/WebP 质量，使编码后的大小不超过 max_bytes，
+最后直接从编码缓冲区生成 base64 data URL（不先转成 bytes 再拼接）。
+编码由 image_encoders.py 中的后端完成；YUV 采集时在 I420 平面上裁剪缩放，整帧不转 BGR
+"""
+
+import base64
+import logging
+import threading
+import time
+
+import cv2
+
+from image_encoders import create_backend
+from regions import crop_i420, person_box
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+
+
+class UploadEncoder:
+    """把检测到的人编码成大小受控的 data URL"""
+
+    def __init__(self, long_edge=1024, max_bytes=200 * 1024, image_format='jpeg',
+                 min_quality=40, max_quality=90, quality_step=5, crop=True, backend='auto'):
+        self.long_edge = long_edge  # 缩放后长边的最大像素数，None 表示不缩放
+        self.max_bytes = max_bytes  # 编码后大小上限(字节)
+        self.image_format = image_format  # jpeg / webp
+        self.min_quality = min_quality  # 质量下限，到下限仍超出大小时按下限上传
+        self.max_quality = max_quality
+        self.quality_step = quality_step  # 质量搜索的粒度，越大编码次数越少
+        self.crop = crop  # 是否裁剪到人物区域
+        self.backend = create_backend(backend)  # 编码后端：auto / turbojpeg / opencv
+        self._opencv = None  # 后端不支持所选格式（如 turbojpeg 不支持 WebP）时改用 OpenCV
+        self.lock = threading.Lock()
+
+        # 统计信息
+        self.requests = 0
+        self.total_bytes = 0
+        self.total_time = 0.0
+        self.total_encodes = 0
+        self.over_budget = 0
+
+    def _crop_box(self, boxes, target, width, height):
+        if self.crop and boxes:
+            x0, y0, x1, y1 = person_box(boxes, target, width, height)
+            if x1 - x0 >= 32 and y1 - y0 >= 32:
+                return x0, y0, x1, y1
+        return 0, 0, width, height
+
+    def _output_size(self, width, height):
+        if self.long_edge and max(width, height) > self.long_edge:
+            scale = self.long_edge / max(width, height)
+            return round(width * scale), round(height * scale)
+        return width, height
+
+    def prepare(self, image, boxes=None, target='face'):
+        """裁剪并缩放 BGR 图，返回的可能是原图的视图"""
+        height, width = image.shape[:2]
+        x0, y0, x1, y1 = self._crop_box(boxes, target, width, height)
+        image = image[y0:y1, x0:x1]
+        size = self._output_size(x1 - x0, y1 - y0)
+        if size != (x1 - x0, y1 - y0):
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return image
+
+    def prepare_i420(self, yuv, boxes=None, target='face'):
+        """在 I420 平面上分别裁剪缩放，返回新的 I420 数组（高为输出高度的 1.5 倍）"""
+        height, width = yuv.shape[0] * 2 // 3, yuv.shape[1]
+        x0, y0, x1, y1 = self._crop_box(boxes, target, width, height)
+        return crop_i420(yuv, (x0, y0, x1, y1), self._output_size(x1 - x0, y1 - y0))
+
+    def _backend(self):
+        if self.image_format in self.backend.formats:
+            return self.backend
+        if self._opencv is None:
+            self._opencv = create_backend('opencv')
+        return self._opencv
+
+    def _encode(self, image, quality, i420=False):
+        backend = self._backend()
+        if i420:
+            return backend.encode_i420(image, image.shape[1], image.shape[0] * 2 // 3, self.image_format, quality)
+        return backend.encode(image, self.image_format, quality)
+
+    def encode(self, image, i420=False, max_bytes=None):
+        """在大小上限内取最高的质量，返回 (编码缓冲区, 质量, 编码次数)；max_bytes 默认用 self.max_bytes"""
+        max_bytes = max_bytes or self.max_bytes
+        buffer = self._encode(image, self.max_quality, i420)
+        encodes = 1
+        if len(buffer) <= max_bytes:
+            return buffer, self.max_quality, encodes
+        # 最高质量超出上限：按 quality_step 的粒度二分查找能放下的最高质量
+        min_quality = min(self.min_quality, self.max_quality)
+        qualities = list(range(min_quality, self.max_quality, self.quality_step))
+        if not qualities:
+            # 质量上限不高于下限，没有可降的余地，按上限上传
+            return buffer, self.max_quality, encodes
+        best, best_quality = None, min_quality
+        lo, hi = 0, len(qualities) - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            candidate = self._encode(image, qualities[mid], i420)
+            encodes += 1
+            if len(candidate) <= max_bytes:
+                best, best_quality = candidate, qualities[mid]
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        if best is None:
+            # 都放不下时二分最后试的就是质量下限
+            best = candidate
+        return best, best_quality, encodes
+
+    def data_url(self, image, boxes=None, target='face', pixel_format='BGR', max_bytes=None):
+        """裁剪、缩放、编码并生成 data URL；pixel_format 为 'YUV420' 时 image 是 I420 平面，
+        一次上传多张图时用 max_bytes 分摊大小上限
+        """
+        max_bytes = max_bytes or self.max_bytes
+        start = time.monotonic()
+        i420 = pixel_format == 'YUV420'
+        if i420:
+            image = self.prepare_i420(image, boxes, target)
+        else:
+            image = self.prepare(image, boxes, target)
+        buffer, quality, encodes = self.encode(image, i420, max_bytes)
+        # b64encode 直接读取编码缓冲区，只在最后生成一次字符串
+        url = f"data:{MIME_TYPES[self.image_format]};base64,{base64.b64encode(buffer).decode('ascii')}"
+        elapsed = time.monotonic() - start
+
+        with self.lock:
+            self.requests += 1
+            self.total_bytes += len(url)
+            self.total_time += elapsed
+            self.total_encodes += encodes
+            if len(buffer) > max_bytes:
+                self.over_budget += 1
+        width, height = image.shape[1], image.shape[0] * 2 // 3 if i420 else image.shape[0]
+        logger.info(
+            f"上传图片: {width}x{height} {self.image_format}({self._backend().name}) 质量 {quality}, "
+            f"{len(buffer) / 1024:.0f} KB(base64 后 {len(url) / 1024:.0f} KB), "
+            f"编码 {encodes} 次 {elapsed * 1000:.0f} ms"
+        )
+        return url
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'avg_kb': self.total_bytes / self.requests / 1024 if self.requests else 0.0,
+            'avg_ms': self.total_time / self.requests * 1000 if self.requests else 0.0,
+            'avg_encodes': self.total_encodes / self.requests if self.requests else 0.0,
+            'over_budget': self.over_budget,
+        }